@@ -4,78 +4,72 @@
 提供基础命令：
 - agent outline: 读取最新或指定文章任务，生成 extracted_meta.json、market_references.json 与 article_structure.md，并将步骤置为待审。
 - agent approve-outline: 将大纲审核通过并生成写作剧本雏形。
+- agent draft: 按剧本与大纲扩写纯文本成稿。
+- agent approve-draft-text: 纯文本稿通过审核，并按配置自动配图、上传草稿。
+- agent images: 生成 image_plan.json 与配图（封面+每章1图），产出含图成稿。
+- agent wechat-draft: 转HTML、上传正文图片与封面，新增公众号草稿。
+- agent batch: 对所有符合条件的文章并行执行 outline 或 draft。
+- agent ingest: 增量摄取 Memories/ 并更新检索索引。
+- agent watch: 常驻监听 Materials/ 与 Memories/，变动时只重跑受影响的阶段（要素提炼 / 记忆索引）。
+- agent stats: 汇总 logs/ 下的埋点，输出各阶段与各文章的 p50/p95/p99 耗时。
+
+命令定义见 agent_cli/cli.py，各命令按需导入；approve-outline 走轻量分派，不加载 typer 与 LLM 相关依赖
+（启动耗时基准：python bench/startup.py；端到端流水线基准：python bench/pipeline.py）。
 
 运行示例：
   python agent.py outline --article "示例文章"
   python agent.py approve-outline --article "示例文章"
+  python agent.py batch draft --workers 4
 """
 from __future__ import annotations
 
-import typer
-from pathlib import Path
-from typing import Optional
-from dotenv import load_dotenv
-import os
-
-from agent_cli.outline import run_outline
-from agent_cli.paths import resolve_article_dir, ensure_article_dirs
-from agent_cli.utils import update_workflow_step, write_text_file
-from agent_cli.draft import run_draft_text_only
-
-
-app = typer.Typer(help="文章创作Agent命令行工具")
-
-# 预加载 .env（项目根目录）
-ROOT = Path(__file__).resolve().parent
-load_dotenv(dotenv_path=ROOT/".env", override=False)
-
-
-@app.command()
-def outline(article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）")) -> None:
-    """生成大纲：extracted_meta.json、market_references.json、article_structure.md，并置待审。"""
-    article_dir = resolve_article_dir(article)
-    ensure_article_dirs(article_dir)
-    run_outline(article_dir)
-    typer.echo(f"[outline] 大纲已生成，待审路径：{article_dir / 'article_structure.md'}")
-
-
-@app.command("approve-outline")
-def approve_outline(article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）")) -> None:
-    """大纲通过审核，写入状态并生成写作剧本雏形。"""
-    article_dir = resolve_article_dir(article)
-    workflow_path = article_dir / "workflow_state.json"
-    update_workflow_step(workflow_path, "outline", "approved")
-
-    writing_plan_path = article_dir / "article_writing.md"
-    if not writing_plan_path.exists():
-        write_text_file(
-            writing_plan_path,
-            """# 写作剧本（雏形）\n\n- [ ] 第1章：按已确认大纲展开\n- [ ] 第2章：……\n\n提示：运行 `agent draft --text-only` 进入文本扩写与事实核查阶段。\n""",
-        )
-    update_workflow_step(workflow_path, "writing_plan", "done")
-    typer.echo(f"[approve-outline] 已通过大纲并生成写作剧本雏形：{writing_plan_path}")
-
-    # 同步Checklist勾选“人工确认A”与“生成写作剧本”
-    checklist = article_dir / "article_creation.md"
-    if checklist.exists():
-        try:
-            text = checklist.read_text(encoding="utf-8")
-            text = text.replace("- [ ] 2. 人工确认A", "- [x] 2. 人工确认A")
-            text = text.replace("- [ ] 3. 生成写作剧本（`article_writing.md`）", "- [x] 3. 生成写作剧本（`article_writing.md`）")
-            checklist.write_text(text, encoding="utf-8")
-        except Exception:
-            pass
-
-
-@app.command("draft")
-def draft_text_only(article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）"), text_only: bool = typer.Option(True, "--text-only", help="仅生成纯文本成稿（不含配图）")) -> None:
-    """按剧本与大纲扩写纯文本成稿，并生成审稿包摘要。"""
-    article_dir = resolve_article_dir(article)
-    run_draft_text_only(article_dir)
-    typer.echo(f"[draft] 已产出纯文本成稿与审稿包：{article_dir}")
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
 
 
-if __name__ == "__main__":
+# 脚本/钩子高频调用的轻量命令：只读写 JSON/Markdown，绕过 typer（及其 click/rich 依赖）直接分派。
+# 需要帮助信息时仍交给 typer，完整命令定义见 agent_cli/cli.py。
+def _approve_outline(article: Optional[str]) -> None:
+    from agent_cli.approve import run_approve_outline
+    from agent_cli.paths import resolve_article_dir
+
+    writing_plan_path = run_approve_outline(resolve_article_dir(article))
+    print(f"[approve-outline] 已通过大纲并生成写作剧本雏形：{writing_plan_path}")
+
+
+FAST_COMMANDS: Dict[str, Callable[[Optional[str]], None]] = {
+    "approve-outline": _approve_outline,
+}
+
+
+def _parse_article(args: List[str]) -> Tuple[bool, Optional[str]]:
+    # 只识别 `--article X` / `--article=X`；其余写法（含 --help）交给 typer 解析并给出标准提示
+    if not args:
+        return True, None
+    if len(args) == 1 and args[0].startswith("--article="):
+        return True, args[0].split("=", 1)[1]
+    if len(args) == 2 and args[0] == "--article":
+        return True, args[1]
+    return False, None
+
+
+def _fast_dispatch(argv: List[str]) -> bool:
+    if not argv or argv[0] not in FAST_COMMANDS:
+        return False
+    ok, article = _parse_article(argv[1:])
+    if not ok:
+        return False
+    FAST_COMMANDS[argv[0]](article)
+    return True
+
+
+def main() -> None:
+    if _fast_dispatch(sys.argv[1:]):
+        return
+    from agent_cli.cli import app
+
     app()
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from agent_cli.utils import update_workflow_step, write_text_file
+
+
+# 人工审核类命令只读写 JSON/Markdown：本模块只依赖标准库与 utils，保证从脚本/钩子调用时启动足够快
+WRITING_PLAN_STUB = """# 写作剧本（雏形）\n\n- [ ] 第1章：按已确认大纲展开\n- [ ] 第2章：……\n\n提示：运行 `agent draft --text-only` 进入文本扩写与事实核查阶段。\n"""
+
+
+def tick_checklist(article_dir: Path, *items: str) -> None:
+    """勾选 `article_creation.md` 中以给定文字开头的待办项；清单不存在或写入失败时忽略。"""
+    checklist = article_dir / "article_creation.md"
+    if not checklist.exists():
+        return
+    try:
+        text = checklist.read_text(encoding="utf-8")
+        for item in items:
+            text = text.replace(f"- [ ] {item}", f"- [x] {item}")
+        checklist.write_text(text, encoding="utf-8")
+    except Exception:
+        pass
+
+
+def run_approve_outline(article_dir: Path) -> Path:
+    """大纲通过审核，写入状态并生成写作剧本雏形；返回剧本路径。"""
+    workflow_path = article_dir / "workflow_state.json"
+    update_workflow_step(workflow_path, "outline", "approved")
+
+    writing_plan_path = article_dir / "article_writing.md"
+    if not writing_plan_path.exists():
+        write_text_file(writing_plan_path, WRITING_PLAN_STUB)
+    update_workflow_step(workflow_path, "writing_plan", "done")
+
+    # 同步Checklist勾选“人工确认A”与“生成写作剧本”
+    tick_checklist(article_dir, "2. 人工确认A", "3. 生成写作剧本（`article_writing.md`）")
+    return writing_plan_path
+
+
+def run_approve_draft_text(article_dir: Path) -> None:
+    """纯文本稿通过人工确认B，之后才允许配图。"""
+    update_workflow_step(article_dir / "workflow_state.json", "draft_text", "approved")
+    tick_checklist(article_dir, "5. 人工确认B")
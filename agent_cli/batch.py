@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from agent_cli.paths import ensure_article_dirs
+from agent_cli.state import list_articles
+from agent_cli.utils import format_table
+
+
+STAGES = ("outline", "draft")
+
+
+@dataclass
+class BatchResult:
+    article: str
+    stage: str
+    status: str  # ok | failed
+    attempts: int
+    seconds: float
+    error: str = ""
+
+
+def _is_eligible(state: Dict[str, object], stage: str) -> bool:
+    steps = state.get("steps", {}) if isinstance(state.get("steps"), dict) else {}
+    if stage == "outline":
+        # 尚未生成大纲（待审或已通过的不再重跑）
+        return steps.get("outline", "") not in ("pending_review", "approved")
+    if stage == "draft":
+        # 大纲已通过且成稿尚未进入审稿
+        return steps.get("outline") == "approved" and steps.get("draft_text", "") not in ("ready_for_review", "approved")
+    raise ValueError(f"未知的批处理阶段: {stage}")
+
+
+def find_eligible_articles(stage: str) -> List[Path]:
+    # 直接按注册表中的状态筛选，无需逐篇读取 workflow_state.json
+    return [a["path"] for a in list_articles() if a["path"].is_dir() and _is_eligible(a, stage)]
+
+
+def _stage_runner(stage: str) -> Callable[[Path], None]:
+    if stage == "outline":
+        from agent_cli.outline import run_outline
+
+        def _run(article_dir: Path) -> None:
+            ensure_article_dirs(article_dir)
+            run_outline(article_dir)
+
+        return _run
+    from agent_cli.draft import run_draft_text_only
+
+    return run_draft_text_only
+
+
+def _run_one(runner: Callable[[Path], None], article_dir: Path, stage: str, max_attempts: int) -> BatchResult:
+    start = time.monotonic()
+    error = ""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            runner(article_dir)
+            return BatchResult(article_dir.name, stage, "ok", attempt, time.monotonic() - start)
+        except Exception as exc:  # 单篇失败不影响其他文章
+            error = f"{type(exc).__name__}: {exc}"
+    return BatchResult(article_dir.name, stage, "failed", max_attempts, time.monotonic() - start, error)
+
+
+def run_batch(article_dirs: List[Path], stage: str, *, workers: int, max_attempts: int) -> List[BatchResult]:
+    """在线程池中对多篇文章执行同一阶段；每篇最多尝试 `max_attempts` 次，结果按输入顺序返回。"""
+    runner = _stage_runner(stage)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(_run_one, runner, d, stage, max(1, max_attempts)) for d in article_dirs]
+        return [f.result() for f in futures]
+
+
+def format_summary(results: List[BatchResult]) -> str:
+    header = ("文章", "阶段", "状态", "尝试", "耗时(s)", "错误")
+    rows = [(r.article, r.stage, r.status, str(r.attempts), f"{r.seconds:.1f}", r.error[:80]) for r in results]
+    ok = sum(1 for r in results if r.status == "ok")
+    return format_table(header, rows) + f"\n\n共 {len(results)} 篇：成功 {ok}，失败 {len(results) - ok}"
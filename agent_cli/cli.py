@@ -0,0 +1,231 @@
+"""
+typer 命令定义。
+
+各命令只在函数体内导入自己用到的模块：requests、jinja2 等重依赖只在真正调用 LLM 的命令里加载，
+.env 也只在这些命令里读取（须在首次请求 LLM 前加载：供应商地址与密钥从环境变量读取）。
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+from agent_cli.paths import ROOT, resolve_article_dir
+
+
+app = typer.Typer(help="文章创作Agent命令行工具")
+
+
+def _load_env() -> None:
+    # 预加载 .env（项目根目录）
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=ROOT / ".env", override=False)
+
+
+def _configure_cache(no_cache: bool, refresh_cache: bool, refresh_market: bool = False) -> None:
+    # 主题级市场参考缓存跟随 LLM 响应缓存的开关；--refresh-market 只重新检索市场参考
+    from agent_cli import llm_cache, market_cache
+
+    if no_cache:
+        llm_cache.configure("off")
+        market_cache.configure("off")
+    elif refresh_cache:
+        llm_cache.configure("refresh")
+        market_cache.configure("refresh")
+    elif refresh_market:
+        market_cache.configure("refresh")
+
+
+@app.command()
+def outline(
+    article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="绕过LLM响应缓存（不读不写）"),
+    refresh_cache: bool = typer.Option(False, "--refresh-cache", help="忽略已缓存响应并写入新结果"),
+    refresh_market: bool = typer.Option(False, "--refresh-market", help="忽略主题级市场参考缓存，重新检索站内模式摘要"),
+) -> None:
+    """生成大纲：extracted_meta.json、market_references.json、article_structure.md，并置待审。"""
+    _load_env()
+    from agent_cli.outline import run_outline
+    from agent_cli.paths import ensure_article_dirs
+
+    _configure_cache(no_cache, refresh_cache, refresh_market)
+    article_dir = resolve_article_dir(article)
+    ensure_article_dirs(article_dir)
+    run_outline(article_dir)
+    typer.echo(f"[outline] 大纲已生成，待审路径：{article_dir / 'article_structure.md'}")
+
+
+@app.command("approve-outline")
+def approve_outline(article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）")) -> None:
+    """大纲通过审核，写入状态并生成写作剧本雏形。"""
+    from agent_cli.approve import run_approve_outline
+
+    writing_plan_path = run_approve_outline(resolve_article_dir(article))
+    typer.echo(f"[approve-outline] 已通过大纲并生成写作剧本雏形：{writing_plan_path}")
+
+
+@app.command("draft")
+def draft_text_only(
+    article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）"),
+    text_only: bool = typer.Option(True, "--text-only", help="仅生成纯文本成稿（不含配图）"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="绕过LLM响应缓存（不读不写）"),
+    refresh_cache: bool = typer.Option(False, "--refresh-cache", help="忽略已缓存响应并写入新结果"),
+) -> None:
+    """按剧本与大纲扩写纯文本成稿，并生成审稿包摘要。"""
+    _load_env()
+    from agent_cli.draft import run_draft_text_only
+
+    _configure_cache(no_cache, refresh_cache)
+    article_dir = resolve_article_dir(article)
+    run_draft_text_only(article_dir)
+    typer.echo(f"[draft] 已产出纯文本成稿与审稿包：{article_dir}")
+
+
+@app.command("approve-draft-text")
+def approve_draft_text(article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）")) -> None:
+    """纯文本稿通过审核（人工确认B）；按配置自动生成配图并上传公众号草稿。"""
+    from agent_cli.approve import run_approve_draft_text
+    from agent_cli.utils import load_agent_config
+
+    article_dir = resolve_article_dir(article)
+    run_approve_draft_text(article_dir)
+    typer.echo(f"[approve-draft-text] 已通过纯文本稿：{article_dir}")
+    cfg = load_agent_config()
+    if cfg.get("images", {}).get("generate_on_text_approval", True):
+        _generate_images(article_dir, replan=False)
+        if cfg.get("wechat", {}).get("enabled", True):
+            _publish_wechat(article_dir, force=False)
+
+
+def _generate_images(article_dir: Path, *, replan: bool) -> None:
+    _load_env()
+    from agent_cli.images import ImageError, run_images
+
+    try:
+        stats = run_images(article_dir, replan=replan)
+    except ImageError as exc:
+        typer.echo(f"[images] {exc}", err=True)
+        raise typer.Exit(code=1)
+    typer.echo(
+        f"[images] 共 {stats['total']} 张：新生成 {stats['generated']}，复用 {stats['reused']}，失败 {stats['failed']}；"
+        f"含图成稿：{article_dir / 'article_draft.md'}"
+    )
+    if stats["failed"]:
+        # 失败的图在 image_plan.json 中标记，重跑时只补生成缺失的部分
+        raise typer.Exit(code=1)
+
+
+@app.command("images")
+def images(
+    article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）"),
+    replan: bool = typer.Option(False, "--replan", help="按当前成稿重建 image_plan.json（提示词未变的图仍会复用）"),
+) -> None:
+    """生成配图计划与图片（封面+每章1图），并产出含图成稿 article_draft.md。"""
+    _generate_images(resolve_article_dir(article), replan=replan)
+
+
+def _publish_wechat(article_dir: Path, *, force: bool) -> None:
+    _load_env()
+    from agent_cli.wechat import WechatError, run_wechat_draft
+
+    try:
+        result = run_wechat_draft(article_dir, force=force)
+    except WechatError as exc:
+        typer.echo(f"[wechat-draft] {exc}", err=True)
+        raise typer.Exit(code=1)
+    if result["skipped"]:
+        typer.echo(f"[wechat-draft] 内容未变，沿用已有草稿 media_id={result['media_id']}（--force 可重新创建）")
+        return
+    typer.echo(
+        f"[wechat-draft] 已新增草稿 media_id={result['media_id']}；图片 {result['images']} 张："
+        f"上传 {result['uploaded']}，复用 {result['reused']}"
+    )
+
+
+@app.command("wechat-draft")
+def wechat_draft(
+    article: Optional[str] = typer.Option(None, help="文章标题（默认选择最新一条进行中任务）"),
+    force: bool = typer.Option(False, "--force", help="内容未变也重新创建草稿"),
+) -> None:
+    """转HTML、并行上传正文图片与封面，并新增公众号草稿。"""
+    _publish_wechat(resolve_article_dir(article), force=force)
+
+
+@app.command("batch")
+def batch(
+    stage: str = typer.Argument(..., help="执行阶段：outline 或 draft"),
+    workers: Optional[int] = typer.Option(None, help="并行处理的文章数（默认读取 batch.workers）"),
+    llm_concurrency: Optional[int] = typer.Option(None, help="每个文本LLM供应商的在途请求上限，对冲时总在途数可达其数倍（默认读取 text_llm.max_inflight）"),
+    max_attempts: Optional[int] = typer.Option(None, help="每篇文章的最大尝试次数（默认读取 batch.max_attempts）"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="绕过LLM响应缓存（不读不写）"),
+    refresh_cache: bool = typer.Option(False, "--refresh-cache", help="忽略已缓存响应并写入新结果"),
+    refresh_market: bool = typer.Option(False, "--refresh-market", help="outline 阶段忽略主题级市场参考缓存，重新检索站内模式摘要"),
+) -> None:
+    """扫描“进行中”下状态符合条件的全部文章，并行执行 outline 或 draft，结束后输出汇总表。"""
+    from agent_cli.batch import STAGES, find_eligible_articles, format_summary, run_batch
+    from agent_cli.utils import load_agent_config
+
+    if stage not in STAGES:
+        raise typer.BadParameter(f"stage 必须是 {' / '.join(STAGES)}")
+    _load_env()
+    from agent_cli import llm_perplexity
+
+    _configure_cache(no_cache, refresh_cache, refresh_market)
+    cfg = load_agent_config().get("batch", {})
+    if llm_concurrency:
+        llm_perplexity.set_max_inflight(llm_concurrency)
+
+    article_dirs = find_eligible_articles(stage)
+    if not article_dirs:
+        typer.echo(f"[batch] 没有待执行 {stage} 的文章")
+        return
+    typer.echo(f"[batch] {stage}：共 {len(article_dirs)} 篇待处理")
+    results = run_batch(
+        article_dirs,
+        stage,
+        workers=workers or int(cfg.get("workers", 4)),
+        max_attempts=max_attempts or int(cfg.get("max_attempts", 2)),
+    )
+    typer.echo(format_summary(results))
+    if any(r.status != "ok" for r in results):
+        raise typer.Exit(code=1)
+
+
+@app.command("ingest")
+def ingest() -> None:
+    """增量摄取 Memories/Contents 与 Memories/Examples，更新 .ingested/ 与检索索引。"""
+    from agent_cli.memory import ingest_memories
+
+    stats = ingest_memories()
+    typer.echo(
+        f"[ingest] 新增 {stats['added']}，更新 {stats['updated']}，删除 {stats['removed']}，未变 {stats['unchanged']}"
+    )
+
+
+@app.command("watch")
+def watch() -> None:
+    """常驻监听 Materials/ 与 Memories/：转写稿变动时重新提炼要素，新增记忆时增量更新索引。"""
+    _load_env()
+    from agent_cli.watch import WatchError, run_watch
+
+    try:
+        run_watch(typer.echo)
+    except WatchError as exc:
+        typer.echo(f"[watch] {exc}", err=True)
+        raise typer.Exit(code=1)
+    except KeyboardInterrupt:
+        typer.echo("[watch] 已退出")
+
+
+@app.command("stats")
+def stats(
+    days: int = typer.Option(7, help="统计最近N天的埋点"),
+    article: Optional[str] = typer.Option(None, help="只看某篇文章"),
+) -> None:
+    """按阶段与文章输出耗时分布（p50/p95/p99），以及LLM缓存命中、重试与兜底次数。"""
+    from agent_cli import telemetry
+
+    summary = telemetry.summarize(telemetry.load_events(days), article)
+    typer.echo(telemetry.format_report(summary))
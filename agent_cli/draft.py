@@ -1,26 +1,36 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 
-from agent_cli.utils import read_json, write_text_file, update_workflow_step
-from agent_cli.llm_perplexity import chat
+from agent_cli.utils import (
+    read_json,
+    write_text_file,
+    write_text_atomic,
+    update_workflow_step,
+    update_workflow_checkpoint,
+    load_agent_config,
+)
+from agent_cli import prompts, telemetry
+from agent_cli.llm_perplexity import chat, chat_stream, stream_enabled
+from agent_cli.transcript import DEFAULT_CHUNK_CHARS, excerpt_for, latest_transcript_path, load_or_build_index
+from agent_cli.verify import verify_draft
 
 
-def _read_text(path: Path) -> str:
-    return path.read_text(encoding="utf-8") if path.exists() else ""
+# 扩写所用提示词模板；任一模板（或平台风格库）改动都会改变检查点键，使已有章节检查点失效
+PROMPT_TEMPLATES = ("draft_intro_prompt.j2", "draft_chapter_prompt.j2", "draft_outro_prompt.j2")
+# 每段提示词中转写素材的默认字符预算（可由 draft.intro_excerpt_chars / draft.section_excerpt_chars 覆盖）
+INTRO_TRANSCRIPT_CHARS = 1200
+SECTION_TRANSCRIPT_CHARS = 1500
 
 
-def _select_transcript(article_dir: Path) -> str:
-    materials = article_dir / "Materials"
-    if not materials.exists():
-        return ""
-    candidates = sorted(
-        [p for p in materials.glob("transcript.*.*") if p.suffix in {".md", ".txt"}],
-        key=lambda p: p.stat().st_mtime,
-        reverse=True,
-    )
-    return _read_text(candidates[0]) if candidates else ""
+def _read_text(path: Path) -> str:
+    return path.read_text(encoding="utf-8") if path.exists() else ""
 
 
 def _parse_outline(article_dir: Path) -> Tuple[List[str], List[Dict[str, Any]]]:
@@ -65,56 +75,60 @@ def _parse_outline(article_dir: Path) -> Tuple[List[str], List[Dict[str, Any]]]:
     return title_suggestions, chapters
 
 
-def _gen_intro_via_llm(meta: Dict[str, Any], transcript: str) -> str:
+def _complete(messages: List[Dict[str, str]], sink: Optional[Callable[[str], None]]) -> str:
+    """有增量输出目标且启用流式时走 SSE，边生成边写出；否则一次性请求。"""
+    if sink is None or not stream_enabled():
+        return chat(messages)
+    chunks: List[str] = []
+    for delta in chat_stream(messages):
+        chunks.append(delta)
+        sink(delta)
+    return "".join(chunks)
+
+
+# 三个 _gen_*_via_llm 在模型调用（或提示词渲染）失败时返回 None，由调用方走规则化兜底且不落检查点
+def _gen_intro_via_llm(
+    meta: Dict[str, Any], excerpt: str, sink: Optional[Callable[[str], None]] = None
+) -> Optional[str]:
     theme = meta.get("title_theme", "本次主题")
     if theme.startswith("# "):
         theme = theme[2:].strip()
-    prompt_user = (
-        "请用中文写一段300字左右的引言，要求：\n"
-        f"- 围绕主题：{theme}\n"
-        "- 结合以下转写素材中的核心意思（严禁逐字复制）：\n" + transcript[:1200] + "\n"
-        "- 口吻：理性、清晰、实操导向\n- 不出现小节标题，不用条目，写成自然段。"
-    )
     try:
-        return chat([
-            {"role": "system", "content": "你是一位资深中文写作者，擅长将口述素材整理为流畅的书面表达。"},
-            {"role": "user", "content": prompt_user},
-        ])
+        system, user = prompts.render_pair(
+            "draft_intro_prompt.j2", theme=theme, excerpt=excerpt, tone=meta.get("tone") or "理性、清晰、实操导向"
+        )
+        return _complete([{"role": "system", "content": system}, {"role": "user", "content": user}], sink)
     except Exception:
-        return f"本文围绕“{theme}”展开，结合一线素材与实践经验，总结可操作的方法与思路。"
+        return None
 
 
-def _gen_section_via_llm(meta: Dict[str, Any], title: str, bullets: List[str], transcript: str) -> str:
-    bullet_text = "\n".join(f"- {b}" for b in bullets)
-    prompt_user = (
-        f"请用中文围绕小节《{title}》写一段400-600字正文，要求：\n"
-        f"- 小节要点：\n{bullet_text}\n"
-        "- 结合下面转写素材的思想（严禁逐字复制），提炼为清晰表述：\n" + transcript[:1500] + "\n"
-        "- 输出为自然段，不要列表、不加小标题，避免空话套话。"
-    )
+def _gen_section_via_llm(
+    meta: Dict[str, Any], title: str, bullets: List[str], excerpt: str, sink: Optional[Callable[[str], None]] = None
+) -> Optional[str]:
     try:
-        return chat([
-            {"role": "system", "content": "你是一位严谨的中文写作者，能把要点扩写为逻辑清晰的段落。"},
-            {"role": "user", "content": prompt_user},
-        ])
+        system, user = prompts.render_pair(
+            "draft_chapter_prompt.j2",
+            title=title,
+            bullets=bullets,
+            excerpt=excerpt,
+            platform_style=prompts.platform_style(meta.get("platform", "wechat_public")),
+        )
+        return _complete([{"role": "system", "content": system}, {"role": "user", "content": user}], sink)
     except Exception:
-        return "（正文自动生成失败，已回退到占位段落。要点：" + "; ".join(bullets) + ")"
+        return None
 
 
-def _gen_outro_via_llm(meta: Dict[str, Any]) -> str:
+def _gen_outro_via_llm(meta: Dict[str, Any], sink: Optional[Callable[[str], None]] = None) -> Optional[str]:
     theme = meta.get("title_theme", "本次主题")
     if theme.startswith("# "):
         theme = theme[2:].strip()
-    prompt_user = (
-        f"请用中文写一段200-300字的结语，主题：{theme}。要求：鼓励读者行动与复盘，避免口号化表达。"
-    )
     try:
-        return chat([
-            {"role": "system", "content": "你是一位中文写作者，擅长总结与行动建议。"},
-            {"role": "user", "content": prompt_user},
-        ])
+        system, user = prompts.render_pair(
+            "draft_outro_prompt.j2", theme=theme, platform_style=prompts.platform_style(meta.get("platform", "wechat_public"))
+        )
+        return _complete([{"role": "system", "content": system}, {"role": "user", "content": user}], sink)
     except Exception:
-        return "在不确定性中，小步快跑、持续复盘是更稳妥的路径。"
+        return None
 
 
 # 规则化兜底：不依赖外部模型，基于提纲与口述素材生成可读正文
@@ -155,51 +169,279 @@ def _rule_based_section(title: str, bullets: List[str], transcript: str) -> str:
     return f"围绕本节要点（{bullets_txt}），结合口述素材可整理为数个关键结论，并据此形成可操作建议。"
 
 
-def _compose_draft(meta: Dict[str, Any], title: str, chapters: List[Dict[str, Any]], transcript: str) -> str:
+def _rule_based_outro() -> str:
+    return "在不确定性中，小步快跑、持续复盘是更稳妥的路径。"
+
+
+def _draft_concurrency() -> int:
+    """读取 `draft.concurrency`，即同时在途的 LLM 请求上限（至少为1）。"""
+    cfg = load_agent_config().get("draft", {})
+    try:
+        return max(1, int(cfg.get("concurrency", 4)))
+    except (TypeError, ValueError):
+        return 4
+
+
+# 章节检查点：每段成功生成的正文按其输入哈希落盘（.checkpoints/draft/<hash>.md），
+# 重跑时只重写大纲有改动的章节；中断后已完成的章节直接复用
+def _checkpoint_dir(article_dir: Path) -> Path:
+    return article_dir / ".checkpoints" / "draft"
+
+
+def _inputs_hash(*parts: Any) -> str:
+    raw = json.dumps([prompts.prompt_version(*PROMPT_TEMPLATES), *parts], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+# 键须覆盖提示词用到的全部输入（模板与风格库内容已由 prompt_version 覆盖）
+def _intro_key(meta: Dict[str, Any], excerpt: str) -> str:
+    return _inputs_hash("intro", meta.get("title_theme", ""), meta.get("tone") or "", excerpt)
+
+
+def _section_key(meta: Dict[str, Any], chapter: Dict[str, Any], excerpt: str) -> str:
+    return _inputs_hash(
+        "section", meta.get("platform", "wechat_public"), chapter["title"], chapter.get("bullets", []), excerpt
+    )
+
+
+def _outro_key(meta: Dict[str, Any]) -> str:
+    return _inputs_hash("outro", meta.get("platform", "wechat_public"), meta.get("title_theme", ""))
+
+
+def _load_checkpoint(ckpt_dir: Optional[Path], key: str) -> Optional[str]:
+    if ckpt_dir is None:
+        return None
+    path = ckpt_dir / f"{key}.md"
+    return path.read_text(encoding="utf-8") if path.exists() else None
+
+
+def _save_checkpoint(ckpt_dir: Optional[Path], key: str, text: str) -> None:
+    if ckpt_dir is None:
+        return
+    write_text_atomic(ckpt_dir / f"{key}.md", text)
+
+
+@contextmanager
+def _stream_part(ckpt_dir: Optional[Path], key: str) -> Iterator[Optional[Callable[[str], None]]]:
+    """流式生成时把增量文本实时追加到 `<hash>.part`；正常结束后删除（结果已另存检查点）。"""
+    if ckpt_dir is None:
+        yield None
+        return
+    ckpt_dir.mkdir(parents=True, exist_ok=True)
+    part_path = ckpt_dir / f"{key}.part"
+    with part_path.open("w", encoding="utf-8") as fh:
+        def _sink(delta: str) -> None:
+            fh.write(delta)
+            fh.flush()
+
+        yield _sink
+    part_path.unlink(missing_ok=True)
+
+
+def _prune_checkpoints(ckpt_dir: Optional[Path], keep: List[str]) -> None:
+    if ckpt_dir is None or not ckpt_dir.exists():
+        return
+    for path in [*ckpt_dir.glob("*.md"), *ckpt_dir.glob("*.part")]:
+        if path.stem not in keep:
+            path.unlink(missing_ok=True)
+
+
+def _fallback(ev: Dict[str, Any], stage: str, **fields: Any) -> None:
+    ev["fallback"] = True
+    telemetry.record("fallback", stage=stage, **fields)
+
+
+def _intro_with_fallback(meta: Dict[str, Any], excerpt: str, ckpt_dir: Optional[Path], key: str) -> str:
+    with telemetry.timed("draft.intro", prompt_chars=len(excerpt)) as ev:
+        cached = _load_checkpoint(ckpt_dir, key)
+        ev["checkpoint_hit"] = cached is not None
+        if cached is not None:
+            return cached
+        with _stream_part(ckpt_dir, key) as sink:
+            intro = _gen_intro_via_llm(meta, excerpt, sink)
+        if intro is None or len(intro.strip()) < 50:
+            # 兜底正文不落检查点，下次运行会重新请求模型
+            _fallback(ev, "draft.intro")
+            return _rule_based_intro(meta, excerpt)
+        _save_checkpoint(ckpt_dir, key, intro)
+        return intro
+
+
+def _section_with_fallback(
+    meta: Dict[str, Any], chapter: Dict[str, Any], excerpt: str, ckpt_dir: Optional[Path], key: str
+) -> str:
+    with telemetry.timed("draft.section", chapter=chapter['title'], prompt_chars=len(excerpt)) as ev:
+        cached = _load_checkpoint(ckpt_dir, key)
+        ev["checkpoint_hit"] = cached is not None
+        if cached is not None:
+            return cached
+        with _stream_part(ckpt_dir, key) as sink:
+            section = _gen_section_via_llm(meta, chapter['title'], chapter.get('bullets', []), excerpt, sink)
+        if section is None or len(section.strip()) < 80:
+            # 兜底正文不落检查点，下次运行会重新请求模型
+            _fallback(ev, "draft.section", chapter=chapter['title'])
+            return _rule_based_section(chapter['title'], chapter.get('bullets', []), excerpt)
+        _save_checkpoint(ckpt_dir, key, section)
+        return section
+
+
+def _outro_with_fallback(meta: Dict[str, Any], ckpt_dir: Optional[Path], key: str) -> str:
+    with telemetry.timed("draft.outro") as ev:
+        cached = _load_checkpoint(ckpt_dir, key)
+        ev["checkpoint_hit"] = cached is not None
+        if cached is not None:
+            return cached
+        with _stream_part(ckpt_dir, key) as sink:
+            outro = _gen_outro_via_llm(meta, sink)
+        if outro is None or len(outro.strip()) < 50:
+            _fallback(ev, "draft.outro")
+            return _rule_based_outro()
+        _save_checkpoint(ckpt_dir, key, outro)
+        return outro
+
+
+# 尚未完成的段落在增量成稿中的占位
+PENDING_PLACEHOLDER = "（本段生成中……）"
+
+
+def _assemble_draft(
+    title: str, chapters: List[Dict[str, Any]], intro: Optional[str], sections: List[Optional[str]], outro: Optional[str]
+) -> str:
+    # 按大纲顺序组装；未完成的段落用占位符
     parts: List[str] = []
     parts.append(f"# {title}")
     parts.append("")
-
-    # 引言
-    intro = _gen_intro_via_llm(meta, transcript)
-    if "自动生成失败" in intro or len(intro.strip()) < 50:
-        intro = _rule_based_intro(meta, transcript)
-    parts.append(intro)
+    parts.append(intro if intro is not None else PENDING_PLACEHOLDER)
     parts.append("")
 
-    # 章节
-    for idx, ch in enumerate(chapters, start=1):
+    for idx, (ch, section) in enumerate(zip(chapters, sections), start=1):
         parts.append(f"## {idx}. {ch['title']}")
-        section = _gen_section_via_llm(meta, ch['title'], ch.get('bullets', []), transcript)
-        if "自动生成失败" in section or len(section.strip()) < 80:
-            section = _rule_based_section(ch['title'], ch.get('bullets', []), transcript)
-        parts.append(section)
+        parts.append(section if section is not None else PENDING_PLACEHOLDER)
         parts.append("")
 
-    # 结语
     parts.append("## 结语")
-    parts.append(_gen_outro_via_llm(meta))
+    parts.append(outro if outro is not None else PENDING_PLACEHOLDER)
 
     return "\n".join(parts).rstrip() + "\n"
 
 
+def _compose_draft(
+    meta: Dict[str, Any],
+    title: str,
+    chapters: List[Dict[str, Any]],
+    transcript: str,
+    *,
+    concurrency: Optional[int] = None,
+    transcript_index: Optional[Dict[str, Any]] = None,
+    checkpoint_dir: Optional[Path] = None,
+    output_path: Optional[Path] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> str:
+    """并发生成各段并按大纲顺序组装。
+
+    每段只携带与其主题最相关的转写片段（`transcript_index` 为切块倒排，缺省时按原文开头截取）；
+    给定 `output_path` 时，每完成一段就原子刷新一次成稿文件，中途被杀也保留已完成的段落；
+    `on_progress` 在章节完成时以“从第1章起连续完成的章节数”回调，用于更新 `last_chapter_done`。
+    """
+    cfg = load_agent_config().get("draft", {})
+    intro_budget = int(cfg.get("intro_excerpt_chars", INTRO_TRANSCRIPT_CHARS))
+    section_budget = int(cfg.get("section_excerpt_chars", SECTION_TRANSCRIPT_CHARS))
+
+    intro_query = " ".join([meta.get("title_theme", ""), *meta.get("key_points", [])])
+    intro_excerpt = excerpt_for(transcript_index, transcript, intro_query, intro_budget)
+    section_excerpts = [
+        excerpt_for(transcript_index, transcript, " ".join([ch["title"], *ch.get("bullets", [])]), section_budget)
+        for ch in chapters
+    ]
+
+    intro_key = _intro_key(meta, intro_excerpt)
+    section_keys = [_section_key(meta, ch, ex) for ch, ex in zip(chapters, section_excerpts)]
+    outro_key = _outro_key(meta)
+
+    results: Dict[str, Any] = {"intro": None, "sections": [None] * len(chapters), "outro": None}
+    lock = threading.Lock()
+
+    def _publish(slot: str, text: str, idx: int = -1) -> None:
+        with lock:
+            if slot == "section":
+                results["sections"][idx] = text
+            else:
+                results[slot] = text
+            if output_path is not None:
+                write_text_atomic(
+                    output_path,
+                    _assemble_draft(title, chapters, results["intro"], results["sections"], results["outro"]),
+                )
+            if slot == "section" and on_progress is not None:
+                done = results["sections"]
+                on_progress(next((i for i, sec in enumerate(done) if sec is None), len(done)))
+
+    def _run_intro() -> None:
+        _publish("intro", _intro_with_fallback(meta, intro_excerpt, checkpoint_dir, intro_key))
+
+    def _run_section(idx: int) -> None:
+        _publish("section", _section_with_fallback(meta, chapters[idx], section_excerpts[idx], checkpoint_dir, section_keys[idx]), idx)
+
+    def _run_outro() -> None:
+        _publish("outro", _outro_with_fallback(meta, checkpoint_dir, outro_key))
+
+    # 引言、各章节与结语相互独立，并发请求；总耗时取决于最慢的一段而非各段之和
+    workers = concurrency or _draft_concurrency()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [telemetry.submit(pool, _run_intro)]
+        futures += [telemetry.submit(pool, _run_section, idx) for idx in range(len(chapters))]
+        futures.append(telemetry.submit(pool, _run_outro))
+        for f in futures:
+            f.result()
+
+    # 清理已不属于当前大纲的旧检查点
+    _prune_checkpoints(checkpoint_dir, [intro_key, *section_keys, outro_key])
+
+    return _assemble_draft(title, chapters, results["intro"], results["sections"], results["outro"])
+
+
 def run_draft_text_only(article_dir: Path) -> None:
+    with telemetry.article_context(article_dir.name), telemetry.timed("draft"):
+        _run_draft_text_only(article_dir)
+
+
+def _run_draft_text_only(article_dir: Path) -> None:
     meta = read_json(article_dir / "extracted_meta.json")
     title_sugs, chapters = _parse_outline(article_dir)
-    transcript = _select_transcript(article_dir)
+    transcript_path = latest_transcript_path(article_dir)
+    transcript = _read_text(transcript_path) if transcript_path else ""
     title = title_sugs[0] if title_sugs else meta.get("title_theme", "你的文章标题")
 
-    draft = _compose_draft(meta, title, chapters, transcript)
-    write_text_file(article_dir / "article_draft_text_only.md", draft)
-
-    # 生成最小核查报告占位（后续接入检索核查）
-    report = (
-        "# 文本审稿包摘要\n\n"
-        "- 已生成纯文本成稿，待事实核查与人工确认B\n"
-        "- 下一步：`agent approve draft-text` 触发配图→转HTML→上传草稿\n"
-    )
-    write_text_file(article_dir / "verification_reports" / "summary.md", report)
+    chunk_chars = int(load_agent_config().get("draft", {}).get("chunk_chars", DEFAULT_CHUNK_CHARS))
+    with telemetry.timed("draft.transcript_index"):
+        transcript_index = load_or_build_index(article_dir, transcript, chunk_chars)
+
+    workflow_path = article_dir / "workflow_state.json"
+    with telemetry.timed("draft.compose", chapters=len(chapters)):
+        draft = _compose_draft(
+            meta,
+            title,
+            chapters,
+            transcript,
+            transcript_index=transcript_index,
+            checkpoint_dir=_checkpoint_dir(article_dir),
+            output_path=article_dir / "article_draft_text_only.md",
+            on_progress=lambda n: update_workflow_checkpoint(workflow_path, "last_chapter_done", n),
+        )
+    write_text_atomic(article_dir / "article_draft_text_only.md", draft)
+
+    if load_agent_config().get("verification", {}).get("enabled", True):
+        # 分章事实核查：写出 verification_reports/chapter-XX.json 与 summary.md
+        with telemetry.timed("draft.verify") as ev:
+            ev.update(verify_draft(article_dir, draft))
+    else:
+        report = (
+            "# 文本审稿包摘要\n\n"
+            "- 已生成纯文本成稿（未启用事实核查），待人工确认B\n"
+            "- 下一步：`agent approve-draft-text` 触发配图→转HTML→上传草稿\n"
+        )
+        write_text_file(article_dir / "verification_reports" / "summary.md", report)
 
-    update_workflow_step(article_dir / "workflow_state.json", "draft_text", "ready_for_review")
+    update_workflow_step(workflow_path, "draft_text", "ready_for_review")
 
 
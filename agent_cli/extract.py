@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agent_cli import prompts, telemetry
+from agent_cli.llm_perplexity import chat_json
+from agent_cli.transcript import iter_clean_chunks
+from agent_cli.utils import load_agent_config, read_json, write_json
+
+
+# 长转写稿要素提取（map-reduce）：流式切块 → 各块并行摘要（结果按块哈希缓存）→ 汇总为主题/要点/关键词
+MAP_TEMPLATE = "extract_chunk_prompt.j2"
+
+
+def _extract_config() -> Dict[str, Any]:
+    cfg = load_agent_config().get("extract", {})
+    return {
+        "workers": max(1, int(cfg.get("workers", 4))),
+        "chunk_chars": int(cfg.get("chunk_chars", 3000)),
+        "reduce_budget_chars": int(cfg.get("reduce_budget_chars", 6000)),
+    }
+
+
+def _summarize_chunk(chunk: str) -> Optional[Dict[str, Any]]:
+    try:
+        system, user = prompts.render_pair("extract_chunk_prompt.j2", chunk=chunk)
+        result = chat_json(system, user)
+    except Exception:
+        return None
+    if not isinstance(result, dict):
+        return None
+    return {
+        "summary": str(result.get("summary", "")),
+        "key_points": [str(k) for k in result.get("key_points", []) if k],
+        "keywords": [str(k) for k in result.get("keywords", []) if k],
+    }
+
+
+def _map_chunk(cache_dir: Path, chunk: str) -> Dict[str, Any]:
+    key = hashlib.sha256(f"{prompts.prompt_version(MAP_TEMPLATE)}\n{chunk}".encode("utf-8")).hexdigest()[:32]
+    cache_path = cache_dir / f"{key}.json"
+    cached = read_json(cache_path)
+    if cached:
+        return cached
+    partial = _summarize_chunk(chunk)
+    if partial is None:
+        telemetry.record("fallback", stage="extract.map")
+        # 失败的块不缓存，下次运行重试；先用原文开头顶替摘要
+        return {"summary": chunk[:200], "key_points": [], "keywords": []}
+    write_json(cache_path, partial)
+    return partial
+
+
+def _reduce(material: str) -> Optional[Dict[str, Any]]:
+    try:
+        system, user = prompts.render_pair("extract_reduce_prompt.j2", material=material)
+        result = chat_json(system, user)
+    except Exception:
+        return None
+    return result if isinstance(result, dict) else None
+
+
+def _join_summaries(summaries: List[str]) -> str:
+    return "\n".join(f"[{i + 1}] {s}" for i, s in enumerate(summaries))
+
+
+def _group_summaries(summaries: List[str], budget: int) -> List[List[str]]:
+    """按原顺序把摘要装进拼接后不超过 budget 的组；除末组外每组至少两段，保证每轮都在收缩。"""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    for summary in summaries:
+        if len(current) >= 2 and len(_join_summaries([*current, summary])) > budget:
+            groups.append(current)
+            current = []
+        current.append(summary)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _combine_summaries(cache_dir: Path, summaries: List[str], cfg: Dict[str, Any]) -> str:
+    """分段摘要按原顺序拼接作为汇总材料；超出 reduce_budget_chars 时逐层分组再摘要，直到放得下。
+
+    各层的组摘要同样按内容哈希缓存，转写稿局部改动时只重算受影响的组。
+    """
+    budget = cfg["reduce_budget_chars"]
+    # 单段过长时先截到半个预算，任意两段都能装进一组
+    summaries = [s[: budget // 2] for s in summaries]
+    with ThreadPoolExecutor(max_workers=cfg["workers"]) as pool:
+        while len(summaries) > 1 and len(_join_summaries(summaries)) > budget:
+            groups = _group_summaries(summaries, budget)
+            # 落单的末组原样保留，不必再摘要一次
+            futures = {
+                i: telemetry.submit(pool, _map_chunk, cache_dir, _join_summaries(g))
+                for i, g in enumerate(groups)
+                if len(g) > 1
+            }
+            summaries = [
+                futures[i].result()["summary"][: budget // 2] if i in futures else g[0] for i, g in enumerate(groups)
+            ]
+    return _join_summaries(summaries)[:budget]
+
+
+def _first_line(path: Path) -> str:
+    with path.open("r", encoding="utf-8", errors="ignore") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                return line
+    return ""
+
+
+def extract_transcript_meta(article_dir: Path, transcript_path: Optional[Path]) -> Dict[str, Any]:
+    """从转写稿提炼 {title_theme, key_points, primary_keywords}；模型不可用时退回首行主题与高频要点。"""
+    if transcript_path is None:
+        return {"title_theme": "待定主题", "key_points": [], "primary_keywords": []}
+
+    cfg = _extract_config()
+    cache_dir = article_dir / ".cache" / "meta_chunks"
+    chunks = iter_clean_chunks(transcript_path, cfg["chunk_chars"])
+    first = next(chunks, "")
+    second = next(chunks, None)
+
+    if second is None:
+        # 单块：直接对原文做一次汇总，无需 map 阶段
+        partials: List[Dict[str, Any]] = []
+        material = first
+    else:
+        # 并行 map；在途块数受限，避免把整份转写稿读入内存
+        slots = threading.BoundedSemaphore(cfg["workers"] * 2)
+        futures: List[Future] = []
+
+        def _submit(pool: ThreadPoolExecutor, chunk: str) -> None:
+            slots.acquire()
+            future = telemetry.submit(pool, _map_chunk, cache_dir, chunk)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+        with ThreadPoolExecutor(max_workers=cfg["workers"]) as pool:
+            _submit(pool, first)
+            _submit(pool, second)
+            for chunk in chunks:
+                _submit(pool, chunk)
+            partials = [f.result() for f in futures]
+
+        with telemetry.timed("extract.combine", partials=len(partials)):
+            material = _combine_summaries(cache_dir, [p["summary"] for p in partials], cfg)
+
+    reduced = _reduce(material)
+    if reduced is None:
+        telemetry.record("fallback", stage="extract.reduce")
+        reduced = {}
+    point_counts = Counter(k for p in partials for k in p["key_points"])
+    keyword_counts = Counter(k for p in partials for k in p["keywords"])
+    return {
+        "title_theme": str(reduced.get("title_theme") or _first_line(transcript_path)[:50] or "待定主题"),
+        "key_points": [str(k) for k in reduced.get("key_points", [])] or [k for k, _ in point_counts.most_common(8)],
+        "primary_keywords": [str(k) for k in reduced.get("primary_keywords", [])]
+        or [k for k, _ in keyword_counts.most_common(6)],
+    }
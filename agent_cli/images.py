@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agent_cli import telemetry
+from agent_cli.approve import tick_checklist
+from agent_cli.utils import (
+    load_agent_config,
+    read_json,
+    update_workflow_step,
+    write_bytes_atomic,
+    write_text_atomic,
+)
+from agent_cli.verify import split_chapters
+
+
+# 配图（PRD 第8步）：生成 image_plan.json（封面 + 每章1图）→ 有界并发调用豆包图像接口 → 嵌入 article_draft.md
+# 图片按“模型+尺寸+完整提示词”哈希命名存于 images/：重跑、中断续跑或改稿时，提示词未变的图直接复用
+DEFAULT_IMAGE_API_URL = "https://ark.cn-beijing.volces.com/api/v3/images/generations"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_CHAPTER_HEADING = re.compile(r"^## (\d+)\.\s")
+
+
+class ImageError(RuntimeError):
+    pass
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _image_config() -> Dict[str, Any]:
+    cfg = load_agent_config().get("images", {})
+    size = str(cfg.get("size", "1024x1024"))
+    return {
+        "model": str(cfg.get("model", "doubao-seedream-3-0-t2i-250415")),
+        "size": size,
+        "cover_size": str(cfg.get("cover_size", size)),
+        "style": str(cfg.get("style", "")),
+        "concurrency": max(1, int(cfg.get("concurrency", 4))),
+        "timeout": float(cfg.get("timeout", 120)),
+        "max_retries": int(cfg.get("max_retries", 3)),
+    }
+
+
+def _get_session(pool_size: int) -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                api_key = os.environ.get("DOUBAO_IMAGE_API_KEY")
+                if not api_key:
+                    raise ImageError("缺少 DOUBAO_IMAGE_API_KEY 环境变量")
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def _full_prompt(entry: Dict[str, Any], cfg: Dict[str, Any]) -> str:
+    return f"{entry['prompt']}，{cfg['style']}" if cfg["style"] else entry["prompt"]
+
+
+def _image_file(entry: Dict[str, Any], cfg: Dict[str, Any]) -> str:
+    key = f"{cfg['model']}\n{entry['size']}\n{_full_prompt(entry, cfg)}"
+    return f"images/{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.png"
+
+
+def _first_sentence(text: str) -> str:
+    match = re.search(r"[^。！？!?\n]{4,}[。！？!?]?", text)
+    return (match.group(0) if match else text).strip()[:60]
+
+
+def build_image_plan(meta: Dict[str, Any], draft: str, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """按成稿生成配图计划：封面取主题与关键词，每个编号章节取标题与首句。"""
+    theme = str(meta.get("title_theme", "")).lstrip("# ").strip() or "文章封面"
+    keywords = [str(k) for k in meta.get("seo", {}).get("primary_keywords", [])][:5]
+    cover_prompt = f"公众号封面插图，主题：{theme}" + (f"，关键词：{'、'.join(keywords)}" if keywords else "")
+    inline: List[Dict[str, Any]] = []
+    for title, body in split_chapters(draft):
+        match = re.match(r"(\d+)\.\s*(.*)", title)
+        if not match:
+            continue
+        inline.append(
+            {
+                "anchor_id": f"ch{match.group(1)}",
+                "prompt": f"文章配图，{match.group(2)}：{_first_sentence(body)}",
+                "alt": match.group(2),
+                "size": cfg["size"],
+            }
+        )
+    return {
+        "cover": {"prompt": cover_prompt, "alt": "封面图", "keywords": keywords, "size": cfg["cover_size"]},
+        "inline": inline,
+    }
+
+
+def _request_image(prompt: str, size: str, cfg: Dict[str, Any]) -> bytes:
+    session = _get_session(cfg["concurrency"])
+    url = os.environ.get("DOUBAO_IMAGE_API_URL") or DEFAULT_IMAGE_API_URL
+    payload = {"model": cfg["model"], "prompt": prompt, "size": size, "response_format": "b64_json"}
+    attempt = 0
+    while True:
+        try:
+            resp = session.post(url, json=payload, timeout=cfg["timeout"])
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            if attempt >= cfg["max_retries"]:
+                raise ImageError(f"图像接口请求失败: {exc}")
+        else:
+            if resp.status_code not in RETRYABLE_STATUS or attempt >= cfg["max_retries"]:
+                break
+            resp.close()
+        attempt += 1
+        time.sleep(min(30.0, 2.0 ** attempt))
+
+    if resp.status_code >= 400:
+        raise ImageError(f"图像接口错误: {resp.status_code} {resp.text[:200]}")
+    try:
+        item = resp.json()["data"][0]
+    except (ValueError, KeyError, IndexError, TypeError) as exc:
+        raise ImageError(f"解析图像接口响应失败: {exc}")
+    if item.get("b64_json"):
+        return base64.b64decode(item["b64_json"])
+    if item.get("url"):
+        # 只返回 URL 的服务：立即下载（临时链接通常很快过期）
+        download = session.get(item["url"], timeout=cfg["timeout"])
+        download.raise_for_status()
+        return download.content
+    raise ImageError("图像接口响应中没有图片数据")
+
+
+def _plan_entries(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [plan["cover"], *plan.get("inline", [])]
+
+
+def embed_images(draft: str, plan: Dict[str, Any]) -> str:
+    """把已生成的图片插入成稿：封面放在一级标题之后，章节图放在对应二级标题之后。"""
+    cover = plan["cover"]
+    by_anchor = {e["anchor_id"]: e for e in plan.get("inline", []) if e.get("status") == "done"}
+    out: List[str] = []
+    insert_cover = cover.get("status") == "done"
+    for ln in draft.splitlines():
+        out.append(ln)
+        if insert_cover and ln.startswith("# "):
+            out += ["", f"![{cover['alt']}]({cover['file']})"]
+            insert_cover = False
+            continue
+        match = _CHAPTER_HEADING.match(ln)
+        entry = by_anchor.get(f"ch{match.group(1)}") if match else None
+        if entry is not None:
+            out += [f"![{entry['alt']}]({entry['file']})", ""]
+    return "\n".join(out).rstrip() + "\n"
+
+
+def run_images(article_dir: Path, *, replan: bool = False) -> Dict[str, int]:
+    with telemetry.article_context(article_dir.name), telemetry.timed("images") as ev:
+        stats = _run_images(article_dir, replan=replan)
+        ev.update(stats)
+        return stats
+
+
+def _run_images(article_dir: Path, *, replan: bool) -> Dict[str, int]:
+    workflow_path = article_dir / "workflow_state.json"
+    state = read_json(workflow_path)
+    gate = load_agent_config().get("review", {}).get("gate_text", True)
+    if gate and state.get("steps", {}).get("draft_text") != "approved":
+        raise ImageError("纯文本稿尚未通过人工确认B，请先运行 `agent approve-draft-text`")
+
+    draft_path = article_dir / "article_draft_text_only.md"
+    if not draft_path.exists():
+        raise ImageError(f"找不到纯文本成稿：{draft_path}")
+    draft = draft_path.read_text(encoding="utf-8")
+    cfg = _image_config()
+
+    # 已有计划（可能被人工改过提示词）直接沿用；--replan 时按当前成稿重建
+    plan_path = article_dir / "image_plan.json"
+    plan = read_json(plan_path)
+    if replan or not plan.get("cover"):
+        meta = read_json(article_dir / "extracted_meta.json")
+        plan = build_image_plan(meta, draft, cfg)
+
+    entries = _plan_entries(plan)
+    stats = {"total": len(entries), "generated": 0, "reused": 0, "failed": 0}
+    for entry in entries:
+        entry.setdefault("size", cfg["size"])
+        entry["file"] = _image_file(entry, cfg)
+        entry.pop("error", None)
+        if (article_dir / entry["file"]).exists():
+            entry["status"] = "done"
+            stats["reused"] += 1
+        else:
+            entry["status"] = "pending"
+    lock = threading.Lock()
+
+    def _save_plan() -> None:
+        write_text_atomic(plan_path, json.dumps(plan, ensure_ascii=False, indent=2))
+
+    _save_plan()
+
+    # 同一提示词只生成一次，结果同时记到引用它的所有条目
+    todo: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        if entry["status"] != "done":
+            todo.setdefault(entry["file"], []).append(entry)
+
+    def _generate(file: str, group: List[Dict[str, Any]]) -> None:
+        head = group[0]
+        with telemetry.timed("images.generate", anchor=head.get("anchor_id", "cover")) as gev:
+            try:
+                data = _request_image(_full_prompt(head, cfg), head["size"], cfg)
+                write_bytes_atomic(article_dir / file, data)
+                status, error = "done", ""
+            except Exception as exc:
+                status, error = "failed", str(exc)[:200]
+                gev["error"] = error
+        with lock:
+            for entry in group:
+                entry["status"] = status
+                if error:
+                    entry["error"] = error
+            stats["generated" if status == "done" else "failed"] += len(group)
+            _save_plan()
+
+    with ThreadPoolExecutor(max_workers=cfg["concurrency"]) as pool:
+        futures = [telemetry.submit(pool, _generate, file, group) for file, group in todo.items()]
+        for f in futures:
+            f.result()
+
+    write_text_atomic(article_dir / "article_draft.md", embed_images(draft, plan))
+    complete = stats["failed"] == 0
+    update_workflow_step(workflow_path, "images", "embedded" if complete else "incomplete")
+    if complete:
+        tick_checklist(article_dir, "6. 生成配图", "7. 生成含图成稿")
+    return stats
+
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agent_cli.paths import ROOT
+from agent_cli.utils import load_agent_config
+
+
+# LLM 响应缓存：按 (model, messages, temperature, max_tokens) 的哈希寻址，落盘于项目根目录
+CACHE_DIR = ROOT / ".cache" / "llm"
+
+# 缓存模式：on=读写；refresh=跳过读取但写入新结果；off=完全绕过
+MODES = ("on", "refresh", "off")
+
+# 条目文件的 mtime 固定为写入时间（TTL 的唯一时钟），atime 由命中时显式设置，作为 LRU 的访问时间
+_mode = "on"
+_evict_lock = threading.Lock()
+_stats_lock = threading.Lock()
+# 进程内累计的缓存总字节数：首次写入时全量统计一次，之后按写入增量维护，超出预算才扫描淘汰；
+# 其他进程的写入不计入，每 _RESCAN_EVERY 次写入重新全量统计校正
+_total_bytes: Optional[int] = None
+_writes_since_scan = 0
+_RESCAN_EVERY = 500
+_EVICT_TO = 0.9
+
+
+def configure(mode: str) -> None:
+    """由 CLI 设置当前进程的缓存模式（--no-cache / --refresh-cache）。"""
+    global _mode
+    if mode not in MODES:
+        raise ValueError(f"未知的缓存模式: {mode}")
+    _mode = mode
+
+
+def _cache_config() -> Dict[str, Any]:
+    cfg = load_agent_config().get("llm_cache", {})
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "max_bytes": int(cfg.get("max_bytes", 200 * 1024 * 1024)),
+        "ttl_seconds": float(cfg.get("ttl_seconds", 7 * 24 * 3600)),
+    }
+
+
+def make_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    raw = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def get(key: str) -> Optional[str]:
+    cfg = _cache_config()
+    if _mode != "on" or not cfg["enabled"]:
+        return None
+    path = _entry_path(key)
+    try:
+        created = path.stat().st_mtime
+        if time.time() - created > cfg["ttl_seconds"]:
+            path.unlink(missing_ok=True)
+            return None
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    # 命中即刷新 atime（mtime 保持为写入时间）
+    try:
+        os.utime(path, (time.time(), created))
+    except OSError:
+        pass
+    return entry.get("content")
+
+
+def put(key: str, content: str) -> None:
+    cfg = _cache_config()
+    if _mode == "off" or not cfg["enabled"]:
+        return
+    path = _entry_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = json.dumps({"created": time.time(), "content": content}, ensure_ascii=False).encode("utf-8")
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    try:
+        replaced = path.stat().st_size
+    except OSError:
+        replaced = 0
+    os.replace(tmp, path)
+    _account(len(data) - replaced, cfg)
+
+
+def _account(delta: int, cfg: Dict[str, Any]) -> None:
+    global _total_bytes, _writes_since_scan
+    with _stats_lock:
+        _writes_since_scan += 1
+        if _total_bytes is not None:
+            _total_bytes += delta
+            if _total_bytes <= cfg["max_bytes"] and _writes_since_scan < _RESCAN_EVERY:
+                return
+        _writes_since_scan = 0
+    _evict(cfg)
+
+
+def _evict(cfg: Dict[str, Any]) -> None:
+    """全量统计并删除过期条目；总大小超过 max_bytes 时按最近访问时间（atime）从旧到新淘汰。"""
+    global _total_bytes
+    # 已有线程在扫描时直接返回，写入方不排队等待
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.time()
+        entries = []
+        total = 0
+        for p in CACHE_DIR.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > cfg["ttl_seconds"]:
+                p.unlink(missing_ok=True)
+                continue
+            entries.append((st.st_atime, st.st_size, p))
+            total += st.st_size
+        if total > cfg["max_bytes"]:
+            # 淘汰到预算的 90% 以下，留出余量，避免此后每次写入都触发扫描
+            target = cfg["max_bytes"] * _EVICT_TO
+            for _, size, p in sorted(entries, key=lambda e: e[0]):
+                p.unlink(missing_ok=True)
+                total -= size
+                if total <= target:
+                    break
+        with _stats_lock:
+            _total_bytes = total
+    finally:
+        _evict_lock.release()
@@ -1,50 +1,410 @@
 from __future__ import annotations
 
-import os
 import json
-from typing import List, Dict, Any
+import random
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 import requests
 
-
-PPLX_BASE_URL = os.environ.get("TEXT_LLM_BASE_URL", "https://api.perplexity.ai")
-PPLX_CHAT_COMPLETIONS = f"{PPLX_BASE_URL.rstrip('/')}/chat/completions"
+from agent_cli import llm_cache, llm_providers, telemetry
+from agent_cli.llm_providers import CancelToken, Cancelled, Provider
+from agent_cli.ratelimit import AdaptiveConcurrency
+from agent_cli.utils import load_agent_config
 
 
 class PerplexityError(RuntimeError):
     pass
 
 
-def _headers() -> Dict[str, str]:
-    api_key = os.environ.get("PERPLEXITY_API_KEY")
-    if not api_key:
-        raise PerplexityError("缺少 PERPLEXITY_API_KEY 环境变量")
+# 可重试的状态码：限流与服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _client_config() -> Dict[str, Any]:
+    """`text_llm` 配置块中的超时/重试参数（缺省值适配单机CLI）；连接池、并发与限速见 llm_providers。"""
+    cfg = load_agent_config().get("text_llm", {})
     return {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
+        "connect_timeout": float(cfg.get("connect_timeout", 10)),
+        "read_timeout": float(cfg.get("read_timeout", 60)),
+        "max_retries": int(cfg.get("max_retries", 3)),
+        "backoff_base": float(cfg.get("backoff_base", 1.0)),
+        "backoff_max": float(cfg.get("backoff_max", 30.0)),
     }
 
 
+def set_max_inflight(limit: int) -> None:
+    """覆盖每个供应商的在途请求上限（不是全局上限：对冲请求另占下一个供应商的额度；需在发出首个请求前调用）。"""
+    llm_providers.set_max_inflight(limit)
+
+
+def _retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _backoff_delay(attempt: int, cfg: Dict[str, Any]) -> float:
+    # 指数退避 + 全抖动，避免多个并发请求同时重试
+    cap = min(cfg["backoff_max"], cfg["backoff_base"] * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def _estimated_tokens(payload: Dict[str, Any]) -> int:
+    # 发送前无法得知实际用量：中文约 1 字 1 token，生成部分按 max_tokens 的一半预估，返回后按 usage 修正
+    prompt = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+    return prompt + int(payload.get("max_tokens", 2048)) // 2
+
+
+def _wait_for_quota(provider: Provider, tokens: int) -> None:
+    waited = 0.0
+    if provider.request_bucket is not None:
+        waited += provider.request_bucket.acquire(1)
+    if provider.token_bucket is not None:
+        waited += provider.token_bucket.acquire(tokens)
+    if waited > 0:
+        telemetry.record("llm_rate_wait", provider=provider.name, waited_ms=round(waited * 1000, 1))
+
+
+def _settle_tokens(provider: Provider, payload: Dict[str, Any], usage: Optional[Dict[str, Any]]) -> None:
+    """按响应中的实际 usage 修正 tokens 桶的预扣量。"""
+    if provider.token_bucket is None or not usage:
+        return
+    actual = (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+    if actual:
+        try:
+            provider.token_bucket.adjust(actual - _estimated_tokens(payload))
+        except sqlite3.Error:
+            pass
+
+
+def _on_retryable(provider: Provider, status: int, tokens: int, delay: float) -> None:
+    try:
+        # 被拒的请求没有消耗 tokens，退还预扣；429 时让所有进程一起暂停 delay 秒
+        if provider.token_bucket is not None:
+            provider.token_bucket.adjust(-tokens)
+        if status == 429 and provider.request_bucket is not None:
+            provider.request_bucket.penalize(delay)
+    except sqlite3.Error:
+        pass
+
+
+class _SlotLease:
+    """一次发送占用的在途额度，只归还一次：正常结束时由发送方归还，对冲落败时由取消回调提前归还。"""
+
+    def __init__(self, slots: AdaptiveConcurrency) -> None:
+        self._slots = slots
+        self._lock = threading.Lock()
+        self._done = False
+
+    def _finish(self) -> bool:
+        with self._lock:
+            done, self._done = self._done, True
+        return not done
+
+    def release(self) -> None:
+        if self._finish():
+            self._slots.release()
+
+
+def _post_with_retry(
+    provider: Provider, payload: Dict[str, Any], *, cancel: CancelToken, stream: bool = False
+) -> Tuple[requests.Response, int, _SlotLease]:
+    """向某个供应商发送请求，遇到限流/5xx/网络错误按退避重试，返回 (响应, 重试次数, 在途额度)。
+
+    非流式请求只在发送期间占用在途额度；流式请求成功返回时额度随响应一起交给调用方，
+    由调用方读完响应体后调用 `lease.release()` 归还；对冲落败（cancel 置位）时额度立即归还。
+    每次发送（含重试）前先向跨进程令牌桶申请配额，等配额时不占在途额度（网络错误后的重试不重复扣配额）；429 与延迟突增会让自适应并发上限收缩。cancel 置位（对冲落败）后不再发送或重试。
+    """
+    cfg = _client_config()
+    session = provider.session()
+    slots = provider.slots
+    timeout = (cfg["connect_timeout"], cfg["read_timeout"])
+    tokens = _estimated_tokens(payload)
+    attempt = 0
+    # 网络错误后的重试沿用上次已扣的配额：请求多半没到达供应商，不能让一次抖动的调用反复扣减共享额度
+    charged = False
+    while True:
+        if not charged:
+            try:
+                _wait_for_quota(provider, tokens)
+            except sqlite3.Error:
+                # 限速状态库不可用时不阻断请求，仅靠并发上限与重试兜底
+                telemetry.record("fallback", stage="llm.rate_limit")
+            charged = True
+        slots.acquire()
+        lease = _SlotLease(slots)
+        cancel.on_cancel(lease.release)
+        keep_slot = False
+        try:
+            if cancel.is_set():
+                raise Cancelled()
+            sent = time.monotonic()
+            resp = session.post(provider.url, json=payload, timeout=timeout, stream=stream)
+            if cancel.is_set():
+                resp.close()
+                raise Cancelled()
+            if resp.status_code == 429:
+                slots.on_throttle()
+            elif resp.status_code < 400:
+                slots.on_success(time.monotonic() - sent, stream=stream)
+            if resp.status_code in RETRYABLE_STATUS and attempt < cfg["max_retries"]:
+                retry_after = _retry_after_seconds(resp)
+                delay = retry_after if retry_after is not None else _backoff_delay(attempt, cfg)
+                resp.close()
+                _on_retryable(provider, resp.status_code, tokens, delay)
+                # 被拒的请求已退还 tokens 预扣，重发时重新申请配额
+                charged = False
+            else:
+                keep_slot = stream
+                return resp, attempt, lease
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            if isinstance(exc, requests.Timeout):
+                slots.on_throttle()
+            if attempt >= cfg["max_retries"]:
+                raise PerplexityError(f"{provider.name} 请求失败（已重试{attempt}次）: {exc}")
+            delay = _backoff_delay(attempt, cfg)
+        finally:
+            # 退避等待期间释放额度
+            if not keep_slot:
+                lease.release()
+        if cancel.wait(delay):
+            raise Cancelled()
+        attempt += 1
+
+
+def _complete_once(
+    provider: Provider, payload: Dict[str, Any], cancel: CancelToken
+) -> Tuple[str, Optional[Dict[str, Any]], int]:
+    """非流式请求一个供应商，返回 (内容, usage, 重试次数)。"""
+    payload = provider.payload_for(payload)
+    resp, retries, _ = _post_with_retry(provider, payload, cancel=cancel)
+    if resp.status_code >= 400:
+        raise PerplexityError(f"{provider.name} API 错误: {resp.status_code} {resp.text}")
+    data = resp.json()
+    try:
+        content = data["choices"][0]["message"]["content"]
+    except Exception as exc:
+        raise PerplexityError(f"解析 {provider.name} 响应失败: {exc}; 原始: {data}")
+    _settle_tokens(provider, payload, data.get("usage"))
+    return content, data.get("usage"), retries
+
+
 def chat(
-    messages: List[Dict[str, str]], *, model: str = "sonar-medium-online", temperature: float = 0.2, max_tokens: int = 2048
+    messages: List[Dict[str, str]],
+    *,
+    model: str = "sonar-medium-online",
+    temperature: float = 0.2,
+    max_tokens: int = 2048,
+    refresh: bool = False,
 ) -> str:
+    """refresh=True 时跳过响应缓存的读取（仍写入新结果），用于调用方要求重新检索的场景。"""
+    start = time.monotonic()
+    prompt_chars = sum(len(m.get("content", "")) for m in messages)
+    cached = None if refresh else llm_cache.get(llm_cache.make_key(model, messages, temperature, max_tokens))
+    if cached is not None:
+        _record_call(start, model, prompt_chars, cached, cache_hit=True)
+        return cached
     payload = {
         "model": model,
         "temperature": temperature,
         "max_tokens": max_tokens,
         "messages": messages,
     }
-    resp = requests.post(PPLX_CHAT_COMPLETIONS, headers=_headers(), json=payload, timeout=60)
-    if resp.status_code >= 400:
-        raise PerplexityError(f"Perplexity API 错误: {resp.status_code} {resp.text}")
-    data = resp.json()
     try:
-        return data["choices"][0]["message"]["content"]
+        (content, usage, retries), provider, hedged = llm_providers.hedged(
+            lambda p, cancel: _complete_once(p, payload, cancel), stream=False, discard=lambda p, result: None
+        )
     except Exception as exc:
-        raise PerplexityError(f"解析 Perplexity 响应失败: {exc}; 原始: {data}")
+        _record_call(start, model, prompt_chars, "", error=str(exc)[:200])
+        raise
+    _record_call(
+        start, model, prompt_chars, content, retries=retries, usage=usage, provider=provider.name, hedged=hedged
+    )
+    if provider.model is None:
+        # 只缓存所请求模型的回答：备用供应商换了模型时不写入，免得以后把它当作主模型的结果命中
+        llm_cache.put(llm_cache.make_key(model, messages, temperature, max_tokens), content)
+    return content
+
+
+def _record_call(
+    start: float,
+    model: str,
+    prompt_chars: int,
+    content: str,
+    *,
+    cache_hit: bool = False,
+    retries: int = 0,
+    usage: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+    provider: str = "",
+    hedged: bool = False,
+    error: str = "",
+) -> None:
+    usage = usage or {}
+    telemetry.record(
+        "llm_call",
+        model=model,
+        provider=provider,
+        latency_ms=round((time.monotonic() - start) * 1000, 1),
+        prompt_chars=prompt_chars,
+        completion_chars=len(content),
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+        retries=retries,
+        cache_hit=cache_hit,
+        stream=stream,
+        hedged=hedged,
+        ok=not error,
+        error=error,
+    )
+
+
+def stream_enabled() -> bool:
+    return bool(load_agent_config().get("text_llm", {}).get("stream", True))
+
+
+def _sse_events(resp: requests.Response) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """逐个产出 SSE 事件中的 (增量文本, usage)。"""
+    resp.encoding = "utf-8"
+    try:
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            choices = event.get("choices") or [{}]
+            # 部分服务在最后一个事件附带 usage
+            yield (choices[0].get("delta") or {}).get("content") or "", event.get("usage")
+    except (requests.RequestException, ValueError, KeyError, IndexError) as exc:
+        raise PerplexityError(f"读取流式响应失败: {exc}")
+
+
+class _OpenStream:
+    """已收到首段内容的流式响应；对冲以首段内容到达（而非响应头）为准。"""
+
+    def __init__(self, provider: Provider, payload: Dict[str, Any], cancel: CancelToken) -> None:
+        self.provider = provider
+        self.payload = provider.payload_for(payload)
+        self.resp, self.retries, self.lease = _post_with_retry(provider, self.payload, stream=True, cancel=cancel)
+        self.head: List[str] = []
+        self.usage: Optional[Dict[str, Any]] = None
+        try:
+            if self.resp.status_code >= 400:
+                raise PerplexityError(f"{provider.name} API 错误: {self.resp.status_code} {self.resp.text}")
+            self.events = _sse_events(self.resp)
+            for delta, usage in self.events:
+                self.usage = usage or self.usage
+                if cancel.is_set():
+                    raise Cancelled()
+                if delta:
+                    self.head.append(delta)
+                    break
+        except BaseException:
+            self.close()
+            raise
+
+    def rest(self) -> Iterator[str]:
+        for delta, usage in self.events:
+            self.usage = usage or self.usage
+            if delta:
+                yield delta
+
+    def close(self) -> None:
+        self.resp.close()
+        self.lease.release()
+
+
+def chat_stream(
+    messages: List[Dict[str, str]], *, model: str = "sonar-medium-online", temperature: float = 0.2, max_tokens: int = 2048
+) -> Iterator[str]:
+    """以 SSE 流式请求 OpenAI 兼容的 `/chat/completions`，逐段产出增量文本。
+
+    缓存命中时一次性产出完整内容；完整读完后写入缓存。首段内容迟迟不到时向下一个供应商发对冲请求。
+    """
+    start = time.monotonic()
+    prompt_chars = sum(len(m.get("content", "")) for m in messages)
+    cached = llm_cache.get(llm_cache.make_key(model, messages, temperature, max_tokens))
+    if cached is not None:
+        _record_call(start, model, prompt_chars, cached, cache_hit=True, stream=True)
+        yield cached
+        return
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "messages": messages,
+        "stream": True,
+    }
+    chunks: List[str] = []
+    opened: Optional[_OpenStream] = None
+    hedged = False
+    try:
+        opened, _, hedged = llm_providers.hedged(
+            lambda p, cancel: _OpenStream(p, payload, cancel), stream=True, discard=lambda p, s: s.close()
+        )
+        try:
+            for delta in opened.head:
+                chunks.append(delta)
+                yield delta
+            for delta in opened.rest():
+                chunks.append(delta)
+                yield delta
+        finally:
+            opened.close()
+    except Exception as exc:
+        if opened is not None:
+            opened.provider.record_failure(str(exc))
+        _record_call(
+            start,
+            model,
+            prompt_chars,
+            "".join(chunks),
+            retries=opened.retries if opened else 0,
+            stream=True,
+            provider=opened.provider.name if opened else "",
+            hedged=hedged,
+            error=str(exc)[:200],
+        )
+        raise
+    content = "".join(chunks)
+    _record_call(
+        start,
+        model,
+        prompt_chars,
+        content,
+        retries=opened.retries,
+        usage=opened.usage,
+        stream=True,
+        provider=opened.provider.name,
+        hedged=hedged,
+    )
+    _settle_tokens(opened.provider, opened.payload, opened.usage)
+    if opened.provider.model is None:
+        llm_cache.put(llm_cache.make_key(model, messages, temperature, max_tokens), content)
 
 
-def chat_json(system_prompt: str, user_prompt: str, *, model: str = "sonar-medium-online", temperature: float = 0.2) -> Any:
+def chat_json(
+    system_prompt: str,
+    user_prompt: str,
+    *,
+    model: str = "sonar-medium-online",
+    temperature: float = 0.2,
+    refresh: bool = False,
+) -> Any:
     content = chat(
         [
             {"role": "system", "content": system_prompt},
@@ -52,6 +412,7 @@ def chat_json(system_prompt: str, user_prompt: str, *, model: str = "sonar-mediu
         ],
         model=model,
         temperature=temperature,
+        refresh=refresh,
     )
     # 试图解析为 JSON（容错处理：截取首尾 ```json 包裹等）
     text = content.strip()
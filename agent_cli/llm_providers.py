@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agent_cli import telemetry
+from agent_cli.paths import ROOT
+from agent_cli.ratelimit import AdaptiveConcurrency, TokenBucket
+from agent_cli.utils import load_agent_config
+
+
+# 文本 LLM 供应商：text_llm.providers 为按优先级排列的 OpenAI 兼容端点（未设置密钥环境变量的跳过）。
+# 每个供应商各自的连接池、限速桶、自适应并发与最近延迟样本；连续失败达到阈值即熔断，冷却期内跳过。
+# hedged()：主供应商超过其历史延迟的 pX 分位仍未完成时，向下一个供应商发对冲请求，先成功者胜出，其余取消；
+# 某个供应商失败时立即切到下一个。
+DEFAULT_PROVIDERS = [
+    {
+        "name": "perplexity",
+        "base_url": "https://api.perplexity.ai",
+        "base_url_env": "TEXT_LLM_BASE_URL",
+        "api_key_env": "PERPLEXITY_API_KEY",
+    }
+]
+# 跨进程限速令牌桶的状态（同一项目下的所有 agent 进程共享）
+RATE_LIMIT_DB = ROOT / ".cache" / "ratelimit.sqlite"
+# 样本不足时不按分位数估计对冲时机
+_MIN_SAMPLES = 20
+
+T = TypeVar("T")
+
+
+class ProviderError(RuntimeError):
+    pass
+
+
+class Cancelled(Exception):
+    """对冲请求中落败的一方被取消。"""
+
+
+class CancelToken(threading.Event):
+    """对冲落败的取消信号。set() 时同步执行登记的回调（如提前归还在途额度）。
+
+    requests 无法打断阻塞中的读取：落败的非流式请求仍会占着一个线程直到响应到达或超时，
+    但它的在途额度在取消时即归还，不再拖低该供应商的有效并发。
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set(self) -> None:
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def provider_config() -> Dict[str, Any]:
+    cfg = load_agent_config().get("text_llm", {})
+    return {
+        "pool_size": int(cfg.get("pool_size", 10)),
+        "max_inflight": int(cfg.get("max_inflight", 8)),
+        "min_inflight": int(cfg.get("min_inflight", 1)),
+        "latency_spike_factor": float(cfg.get("latency_spike_factor", 2.5)),
+        # 0 表示不限速；按账号配额填写（各供应商可在自己的条目里覆盖）
+        "requests_per_minute": float(cfg.get("requests_per_minute", 0)),
+        "tokens_per_minute": float(cfg.get("tokens_per_minute", 0)),
+        "rate_burst_seconds": float(cfg.get("rate_burst_seconds", 10)),
+        "hedge_percentile": float(cfg.get("hedge_percentile", 95)),
+        "hedge_min_delay": float(cfg.get("hedge_min_delay_ms", 1000)) / 1000,
+        "hedge_default_delay": float(cfg.get("hedge_default_delay_ms", 15000)) / 1000,
+        "failure_threshold": int(cfg.get("provider_failure_threshold", 3)),
+        "cooldown": float(cfg.get("provider_cooldown_seconds", 60)),
+        "providers": list(cfg.get("providers") or DEFAULT_PROVIDERS),
+    }
+
+
+class Provider:
+    def __init__(self, spec: Dict[str, Any], cfg: Dict[str, Any], max_inflight: int) -> None:
+        self.name = str(spec.get("name") or spec.get("base_url"))
+        base_url = os.environ.get(spec.get("base_url_env") or "") or spec.get("base_url") or ""
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.api_key_env = str(spec.get("api_key_env") or "")
+        self.model: Optional[str] = spec.get("model") or None
+        self._cfg = cfg
+        self._pool_size = cfg["pool_size"]
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+        self._latency: Dict[bool, Deque[float]] = {False: deque(maxlen=200), True: deque(maxlen=200)}
+        self._failures = 0
+        self.down_until = 0.0
+        self.slots = AdaptiveConcurrency(
+            max_inflight, min_limit=cfg["min_inflight"], latency_factor=cfg["latency_spike_factor"]
+        )
+        rpm = float(spec.get("requests_per_minute", cfg["requests_per_minute"]))
+        tpm = float(spec.get("tokens_per_minute", cfg["tokens_per_minute"]))
+        burst = cfg["rate_burst_seconds"]
+        self.request_bucket = TokenBucket(RATE_LIMIT_DB, f"{self.name}.requests", rpm, burst) if rpm > 0 else None
+        self.token_bucket = TokenBucket(RATE_LIMIT_DB, f"{self.name}.tokens", tpm, burst) if tpm > 0 else None
+
+    def configured(self) -> bool:
+        return bool(os.environ.get(self.api_key_env))
+
+    def session(self) -> requests.Session:
+        """该供应商的长连接客户端：复用 TCP/TLS 连接，请求头只构建一次。"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    api_key = os.environ.get(self.api_key_env)
+                    if not api_key:
+                        raise ProviderError(f"缺少 {self.api_key_env} 环境变量")
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+                    self._session = session
+        return self._session
+
+    def payload_for(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {**payload, "model": self.model} if self.model else payload
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def hedge_delay(self, stream: bool) -> float:
+        with self._lock:
+            samples = sorted(self._latency[stream])
+        if len(samples) < _MIN_SAMPLES:
+            return self._cfg["hedge_default_delay"]
+        rank = min(len(samples) - 1, int(len(samples) * self._cfg["hedge_percentile"] / 100))
+        return max(self._cfg["hedge_min_delay"], samples[rank])
+
+    def record_success(self, latency: float, stream: bool) -> None:
+        with self._lock:
+            self._latency[stream].append(latency)
+            self._failures = 0
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures < self._cfg["failure_threshold"] or not self.available():
+                return
+            self.down_until = time.monotonic() + self._cfg["cooldown"]
+        telemetry.record("llm_provider_down", provider=self.name, cooldown_s=self._cfg["cooldown"], error=error[:200])
+
+
+_providers: Optional[List[Provider]] = None
+_providers_lock = threading.Lock()
+_max_inflight: Optional[int] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def set_max_inflight(limit: int) -> None:
+    """覆盖每个供应商的在途请求上限（需在发出首个请求前调用）。"""
+    global _max_inflight, _providers
+    with _providers_lock:
+        _max_inflight = max(1, limit)
+        _providers = None
+
+
+def providers() -> List[Provider]:
+    """已配置密钥的供应商（按优先级）；一个都没有时保留第一个，使用时报出缺少密钥。"""
+    global _providers
+    if _providers is None:
+        with _providers_lock:
+            if _providers is None:
+                cfg = provider_config()
+                limit = _max_inflight or cfg["max_inflight"]
+                built = [Provider(spec, cfg, limit) for spec in cfg["providers"]]
+                _providers = [p for p in built if p.configured()] or built[:1]
+    return _providers
+
+
+def _candidates() -> List[Provider]:
+    # 熔断中的供应商排到最后（全部熔断时仍按最早恢复的顺序尝试）
+    all_providers = providers()
+    healthy = [p for p in all_providers if p.available()]
+    return healthy + sorted((p for p in all_providers if not p.available()), key=lambda p: p.down_until)
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _providers_lock:
+            if _executor is None:
+                workers = max(32, 4 * (_max_inflight or provider_config()["max_inflight"]))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-hedge")
+    return _executor
+
+
+def hedged(
+    attempt: Callable[[Provider, CancelToken], T],
+    *,
+    stream: bool,
+    discard: Callable[[Provider, T], None],
+) -> Tuple[T, Provider, bool]:
+    """按对冲/故障转移策略执行 attempt(供应商, 取消信号)，返回 (结果, 胜出的供应商, 是否发过对冲)。
+
+    落败方收到取消信号：在途额度立即归还；尚未收到响应的在收到后立即关闭连接并放弃重试；
+    已成功的结果交给 discard 释放。
+    """
+    candidates = _candidates()
+    if len(candidates) == 1:
+        provider = candidates[0]
+        start = time.monotonic()
+        try:
+            result = attempt(provider, CancelToken())
+        except Exception as exc:
+            provider.record_failure(str(exc))
+            raise
+        provider.record_success(time.monotonic() - start, stream)
+        return result, provider, False
+
+    pending: Dict[Future, Tuple[Provider, CancelToken, float]] = {}
+    errors: List[str] = []
+    hedged_any = False
+    next_index = 0
+
+    def _launch() -> Provider:
+        nonlocal next_index
+        provider = candidates[next_index]
+        next_index += 1
+        cancel = CancelToken()
+        pending[telemetry.submit(_pool(), attempt, provider, cancel)] = (provider, cancel, time.monotonic())
+        return provider
+
+    delay = _launch().hedge_delay(stream)
+    deadline = time.monotonic() + delay
+    while pending:
+        can_hedge = next_index < len(candidates)
+        timeout = max(0.0, deadline - time.monotonic()) if can_hedge else None
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # 超过对冲时机仍未完成：向下一个供应商发同样的请求，与在途请求竞速
+            provider = _launch()
+            hedged_any = True
+            telemetry.record("llm_hedge", provider=provider.name, after_ms=round(delay * 1000))
+            delay = provider.hedge_delay(stream)
+            deadline = time.monotonic() + delay
+            continue
+        for future in done:
+            provider, _, started = pending.pop(future)
+            try:
+                result = future.result()
+            except Cancelled:
+                continue
+            except Exception as exc:
+                provider.record_failure(str(exc))
+                errors.append(f"{provider.name}: {exc}")
+                continue
+            provider.record_success(time.monotonic() - started, stream)
+            for loser, (loser_provider, cancel, _) in pending.items():
+                cancel.set()
+                loser.add_done_callback(lambda f, p=loser_provider: _discard_result(f, p, discard))
+            return result, provider, hedged_any
+        if not pending and next_index < len(candidates):
+            # 全部在途请求都失败：立即切换到下一个供应商
+            delay = _launch().hedge_delay(stream)
+            deadline = time.monotonic() + delay
+    raise ProviderError("所有文本LLM供应商均失败：" + "；".join(errors))
+
+
+def _discard_result(future: Future, provider: Provider, discard: Callable[[Provider, Any], None]) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    discard(provider, future.result())
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from agent_cli.paths import ROOT
+from agent_cli.retrieval import tokenize
+from agent_cli.utils import load_agent_config
+
+
+# 主题级市场参考缓存：公众号站内的标题钩子/结构套路变化很慢，同一主题的多篇文章共享一次检索结果。
+# 键为归一化后的 (平台, 主题, 关键词)；未精确命中时按主题+关键词词项的 Jaccard 相似度匹配近似主题。
+# 存于 SQLite，batch / watch / 手动命令等多个进程共享；过期条目与超出条目上限的最久未用条目会被淘汰。
+CACHE_DB = ROOT / ".cache" / "market.sqlite"
+
+# 缓存模式与 llm_cache 一致：on=读写；refresh=忽略本进程启动前写入的条目（batch 中同主题的后续文章
+# 仍复用本次刚检索的结果）；off=完全绕过
+MODES = ("on", "refresh", "off")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    platform TEXT NOT NULL,
+    version TEXT NOT NULL,
+    theme TEXT NOT NULL,
+    terms TEXT NOT NULL,
+    market TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_scope ON entries (platform, version);
+"""
+_PUNCT = re.compile(r"[\s\W_]+")
+
+_mode = "on"
+_refresh_since = 0.0
+_local = threading.local()
+
+
+def configure(mode: str) -> None:
+    """由 CLI 设置当前进程的缓存模式（--refresh-market / --no-cache / --refresh-cache）。"""
+    global _mode, _refresh_since
+    if mode not in MODES:
+        raise ValueError(f"未知的缓存模式: {mode}")
+    _mode = mode
+    _refresh_since = time.time() if mode == "refresh" else 0.0
+
+
+def mode() -> str:
+    return _mode
+
+
+def _cache_config() -> Dict[str, Any]:
+    cfg = load_agent_config().get("market_cache", {})
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "ttl_seconds": float(cfg.get("ttl_seconds", 14 * 86400)),
+        "similarity": float(cfg.get("similarity_threshold", 0.6)),
+        "max_entries": max(1, int(cfg.get("max_entries", 500))),
+    }
+
+
+def _conn() -> sqlite3.Connection:
+    # 每个线程一条连接（batch 多篇并行时各自查询）
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(CACHE_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def normalize_theme(text: str) -> str:
+    """全半角统一、小写，去掉空白与标点：“AI 写作，自动化！”与“ai写作自动化”视为同一主题。"""
+    return _PUNCT.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def _terms(theme: str, keywords: Iterable[str]) -> Set[str]:
+    terms = set(tokenize(theme))
+    for kw in keywords:
+        terms.update(tokenize(kw))
+    return terms
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _key(platform: str, version: str, theme: str, keywords: List[str]) -> str:
+    return "\n".join([platform, version, theme, ",".join(keywords)])
+
+
+def _scope(theme: str, keywords: Iterable[str]) -> Tuple[str, List[str]]:
+    return normalize_theme(theme), sorted({normalize_theme(k) for k in keywords} - {""})
+
+
+def lookup(platform: str, version: str, theme: str, keywords: Iterable[str]) -> Optional[Tuple[Dict[str, Any], float]]:
+    """返回 (缓存的市场参考, 相似度)；精确命中相似度为 1.0，未命中或过期返回 None。"""
+    cfg = _cache_config()
+    if _mode == "off" or not cfg["enabled"]:
+        return None
+    norm, kws = _scope(theme, keywords)
+    wanted = _terms(norm, kws)
+    try:
+        conn = _conn()
+        rows = conn.execute(
+            "SELECT key, terms, market FROM entries WHERE platform = ? AND version = ? AND created >= ?",
+            (platform, version, max(time.time() - cfg["ttl_seconds"], _refresh_since)),
+        ).fetchall()
+    except sqlite3.Error:
+        # 缓存库损坏或长时间被锁：当作未命中，照常检索
+        return None
+    exact = _key(platform, version, norm, kws)
+    best: Optional[Tuple[float, str, str]] = None
+    for key, terms, market in rows:
+        score = 1.0 if key == exact else _jaccard(wanted, set(terms.split()))
+        if score >= cfg["similarity"] and (best is None or score > best[0]):
+            best = (score, key, market)
+    if best is None:
+        return None
+    score, key, market = best
+    try:
+        with conn:
+            # 命中即刷新访问时间，作为 LRU 淘汰依据
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+    except sqlite3.Error:
+        pass
+    return json.loads(market), score
+
+
+def store(platform: str, version: str, theme: str, keywords: Iterable[str], market: Dict[str, Any]) -> None:
+    cfg = _cache_config()
+    if _mode == "off" or not cfg["enabled"]:
+        return
+    norm, kws = _scope(theme, keywords)
+    now = time.time()
+    try:
+        conn = _conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, platform, version, theme, terms, market, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _key(platform, version, norm, kws),
+                    platform,
+                    version,
+                    norm,
+                    " ".join(sorted(_terms(norm, kws))),
+                    json.dumps(market, ensure_ascii=False),
+                    now,
+                    now,
+                ),
+            )
+            _evict(conn, cfg, now)
+    except sqlite3.Error:
+        pass
+
+
+def _evict(conn: sqlite3.Connection, cfg: Dict[str, Any], now: float) -> None:
+    """删除过期条目；条目数超过 max_entries 时按最近访问时间从旧到新淘汰。"""
+    conn.execute("DELETE FROM entries WHERE created < ?", (now - cfg["ttl_seconds"],))
+    conn.execute(
+        "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+        (cfg["max_entries"],),
+    )
+
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import hashlib
+import html
+import re
+import sqlite3
+import threading
+import zipfile
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List
+
+from agent_cli.paths import ROOT
+from agent_cli.retrieval import bm25_rank, term_counts
+from agent_cli.utils import write_json, write_text_atomic
+
+
+MEMORIES_DIR = ROOT / "Memories"
+INGESTED_DIR = MEMORIES_DIR / ".ingested"
+INDEX_DB = INGESTED_DIR / "index.sqlite"
+MEMORY_INDEX_JSON = MEMORIES_DIR / "memory_indexing.json"
+
+# 记忆来源：自有作品 / 标杆案例，id 前缀与 PRD 示例一致（c001 / e102）
+SOURCES = {"own": ("Contents", "c"), "reference": ("Examples", "e")}
+SUPPORTED_SUFFIXES = {".md", ".txt", ".html", ".htm", ".docx", ".pdf"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+"""
+
+# 同一进程内串行化摄取（batch 多篇并行时只需一个线程做增量更新）
+_ingest_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    INGESTED_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(INDEX_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _doc_id(kind: str, rel_path: str) -> str:
+    prefix = SOURCES[kind][1]
+    return prefix + hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:10]
+
+
+def _extract_docx(path: Path) -> str:
+    with zipfile.ZipFile(path) as zf:
+        xml = zf.read("word/document.xml").decode("utf-8", errors="ignore")
+    xml = re.sub(r"</w:p>", "\n", xml)
+    return html.unescape(re.sub(r"<[^>]+>", "", xml))
+
+
+def _extract_pdf(path: Path) -> str:
+    try:
+        from pypdf import PdfReader  # 可选依赖
+    except ImportError:
+        return ""
+    return "\n".join(page.extract_text() or "" for page in PdfReader(str(path)).pages)
+
+
+def extract_text(path: Path) -> str:
+    """把任意格式的记忆文件抽取为纯文本；不支持或解析失败时返回空串。"""
+    suffix = path.suffix.lower()
+    try:
+        if suffix in {".md", ".txt"}:
+            return path.read_text(encoding="utf-8", errors="ignore")
+        if suffix in {".html", ".htm"}:
+            raw = path.read_text(encoding="utf-8", errors="ignore")
+            raw = re.sub(r"(?is)<(script|style).*?</\1>", "", raw)
+            return html.unescape(re.sub(r"<[^>]+>", " ", raw))
+        if suffix == ".docx":
+            return _extract_docx(path)
+        if suffix == ".pdf":
+            return _extract_pdf(path)
+    except Exception:
+        return ""
+    return ""
+
+
+def _guess_title(text: str, path: Path) -> str:
+    for ln in text.splitlines():
+        ln = ln.strip().lstrip("#").strip()
+        if ln:
+            return ln[:60]
+    return path.stem
+
+
+def _scan_sources() -> Dict[str, Dict[str, Any]]:
+    found: Dict[str, Dict[str, Any]] = {}
+    for kind, (subdir, _) in SOURCES.items():
+        base = MEMORIES_DIR / subdir
+        if not base.exists():
+            continue
+        for p in base.rglob("*"):
+            if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES and not p.name.startswith("."):
+                rel = p.relative_to(ROOT).as_posix()
+                st = p.stat()
+                found[rel] = {"kind": kind, "path": p, "mtime": st.st_mtime, "size": st.st_size}
+    return found
+
+
+def _delete_postings(conn: sqlite3.Connection, doc_id: str) -> None:
+    # 倒排只按 (term, doc_id) 建主键：用上次摄取的文本还原词表，逐条按主键删除，避免全表扫描
+    ingested = INGESTED_DIR / f"{doc_id}.txt"
+    if not ingested.exists():
+        conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        return
+    terms = term_counts(ingested.read_text(encoding="utf-8"))
+    conn.executemany("DELETE FROM postings WHERE term = ? AND doc_id = ?", [(t, doc_id) for t in terms])
+
+
+def _remove_doc(conn: sqlite3.Connection, doc_id: str) -> None:
+    _delete_postings(conn, doc_id)
+    conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+    (INGESTED_DIR / f"{doc_id}.txt").unlink(missing_ok=True)
+
+
+def ingest_memories() -> Dict[str, int]:
+    """增量摄取 `Memories/Contents` 与 `Memories/Examples`。
+
+    以 mtime+size 快速判断是否变动，变动时再比对内容哈希；只重写变动文件的
+    `.ingested/<id>.txt` 与倒排记录，索引原地更新而非整体重建。返回各类计数。
+    """
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    with _ingest_lock, closing(_connect()) as conn, conn:
+        known = {
+            row[0]: {"id": row[1], "sha256": row[2], "mtime": row[3], "size": row[4]}
+            for row in conn.execute("SELECT path, id, sha256, mtime, size FROM docs")
+        }
+        found = _scan_sources()
+
+        for rel in set(known) - set(found):
+            _remove_doc(conn, known[rel]["id"])
+            stats["removed"] += 1
+
+        for rel, info in found.items():
+            old = known.get(rel)
+            if old and old["mtime"] == info["mtime"] and old["size"] == info["size"]:
+                stats["unchanged"] += 1
+                continue
+            data = info["path"].read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            if old and old["sha256"] == digest:
+                # 仅 mtime 变化（如被 touch），内容未变
+                conn.execute("UPDATE docs SET mtime = ?, size = ? WHERE id = ?", (info["mtime"], info["size"], old["id"]))
+                stats["unchanged"] += 1
+                continue
+
+            doc_id = _doc_id(info["kind"], rel)
+            text = extract_text(info["path"])
+            counts = term_counts(text)
+            if old:
+                _delete_postings(conn, doc_id)
+            conn.executemany(
+                "INSERT INTO postings(term, doc_id, tf) VALUES (?, ?, ?)",
+                [(term, doc_id, tf) for term, tf in counts.items()],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO docs(id, kind, path, title, sha256, mtime, size, length) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, info["kind"], rel, _guess_title(text, info["path"]), digest, info["mtime"], info["size"], sum(counts.values())),
+            )
+            write_text_atomic(INGESTED_DIR / f"{doc_id}.txt", text)
+            stats["updated" if old else "added"] += 1
+
+        if stats["added"] or stats["updated"] or stats["removed"] or not MEMORY_INDEX_JSON.exists():
+            _write_memory_indexing(conn)
+    return stats
+
+
+def _write_memory_indexing(conn: sqlite3.Connection) -> None:
+    # 人类可读的索引元信息（PRD: Memories/memory_indexing.json）
+    out: Dict[str, List[Dict[str, Any]]] = {"own_works": [], "reference_examples": []}
+    for doc_id, kind, path, title in conn.execute("SELECT id, kind, path, title FROM docs ORDER BY path"):
+        key = "own_works" if kind == "own" else "reference_examples"
+        out[key].append({"id": doc_id, "title": title, "path": path})
+    write_json(MEMORY_INDEX_JSON, out)
+
+
+def search_memories(query: str, kind: str, top_k: int) -> List[Dict[str, Any]]:
+    """在指定来源（own / reference）中按 BM25 检索，返回 [{id, title, path, score}]。"""
+    if not INDEX_DB.exists() or top_k <= 0:
+        return []
+    terms = list(term_counts(query))
+    if not terms:
+        return []
+    with closing(_connect()) as conn:
+        lengths = {doc_id: length for doc_id, length in conn.execute("SELECT id, length FROM docs WHERE kind = ?", (kind,))}
+        postings: Dict[str, Dict[str, int]] = {}
+        # SQLite 单条语句的参数个数有上限，分批查询
+        for i in range(0, len(terms), 500):
+            batch = terms[i : i + 500]
+            sql = f"SELECT term, doc_id, tf FROM postings WHERE term IN ({','.join('?' * len(batch))})"
+            for term, doc_id, tf in conn.execute(sql, batch):
+                postings.setdefault(term, {})[doc_id] = tf
+        ranked = bm25_rank(query, postings, lengths, top_k)
+        meta: Dict[str, Dict[str, str]] = {}
+        for doc_id, _ in ranked:
+            row = conn.execute("SELECT title, path FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if row:
+                meta[doc_id] = {"title": row[0], "path": row[1]}
+    return [{"id": doc_id, **meta.get(doc_id, {}), "score": round(score, 4)} for doc_id, score in ranked]
+
+
+def retrieve_memory_basis(extracted_meta: Dict[str, Any], own_top_k: int = 2, reference_top_k: int = 2) -> Dict[str, Any]:
+    """按任务要素检索风格基准：自有作品TopN + 标杆案例TopN。"""
+    theme = extracted_meta.get("title_theme", "")
+    keywords = extracted_meta.get("seo", {}).get("primary_keywords", [])
+    query = " ".join([theme, *extracted_meta.get("key_points", []), *keywords])
+    return {
+        "own_top2": search_memories(query, "own", own_top_k),
+        "reference_top2": search_memories(query, "reference", reference_top_k),
+    }
+
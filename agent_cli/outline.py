@@ -1,11 +1,26 @@
 from __future__ import annotations
 
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict
 
-from agent_cli.utils import read_json, write_json, write_text_file, update_workflow_step
+from agent_cli import market_cache, prompts, telemetry
+from agent_cli.utils import (
+    mutate_workflow_state,
+    read_json,
+    update_workflow_field,
+    update_workflow_step,
+    write_json,
+    write_text_file,
+)
 from agent_cli.llm_perplexity import chat_json
+from agent_cli.memory import ingest_memories, retrieve_memory_basis
+from agent_cli.extract import extract_transcript_meta
+from agent_cli.transcript import latest_transcript_path
+
+
+MARKET_TEMPLATE = "market_reference_prompt.j2"
 
 
 def _load_agent_config(root: Path) -> Dict[str, Any]:
@@ -13,33 +28,17 @@ def _load_agent_config(root: Path) -> Dict[str, Any]:
     return read_json(cfg_path)
 
 
-def _select_primary_materials(article_dir: Path) -> Dict[str, str]:
-    materials_dir = article_dir / "Materials"
-    if not materials_dir.exists():
-        return {"transcript": ""}
-    # 选最新的 transcript.*.txt / .md
-    candidates = sorted(
-        [p for p in materials_dir.glob("transcript.*.*") if p.suffix in {".txt", ".md"}],
-        key=lambda p: p.stat().st_mtime,
-        reverse=True,
-    )
-    transcript_content = candidates[0].read_text(encoding="utf-8") if candidates else ""
-    return {"transcript": transcript_content}
-
-
 def _make_extracted_meta(article_dir: Path) -> Dict[str, Any]:
-    mats = _select_primary_materials(article_dir)
-    transcript = mats.get("transcript", "").strip()
-    # 极简占位实现：从转写首行猜测主题
-    title_theme = transcript.splitlines()[0][:50] if transcript else "待定主题"
+    # 流式 map-reduce 提炼主题/要点/关键词，长转写稿也不会整篇读入内存
+    extracted = extract_transcript_meta(article_dir, latest_transcript_path(article_dir))
     meta = {
-        "title_theme": title_theme,
+        "title_theme": extracted["title_theme"],
         "target_audience": "微信公众号作者",
         "goals": ["降低创作成本", "提高更新频率"],
-        "key_points": [],
+        "key_points": extracted["key_points"],
         "constraints": ["不抄袭", "风格统一"],
         "tone": "理性专业，实操为主",
-        "seo": {"primary_keywords": []},
+        "seo": {"primary_keywords": extracted["primary_keywords"]},
         "platform": "wechat_public",
         "style_refs": {"own_works": [], "reference_examples": []},
     }
@@ -47,20 +46,50 @@ def _make_extracted_meta(article_dir: Path) -> Dict[str, Any]:
     return meta
 
 
+def _mark_extracted(state: Dict[str, Any]) -> None:
+    # 只标记提炼步骤完成，不改 current_step：已进入大纲/成稿阶段的文章不能因转写稿改动而回退
+    state.setdefault("steps", {})["extract_meta"] = "done"
+
+
+def refresh_extracted_meta(article_dir: Path) -> Dict[str, Any]:
+    """转写稿变动后只重新提炼主题/要点/关键词；已有 extracted_meta.json 的其余字段（风格基准等）保留。"""
+    meta_path = article_dir / "extracted_meta.json"
+    meta = read_json(meta_path)
+    if not meta:
+        meta = _make_extracted_meta(article_dir)
+    else:
+        extracted = extract_transcript_meta(article_dir, latest_transcript_path(article_dir))
+        meta["title_theme"] = extracted["title_theme"]
+        meta["key_points"] = extracted["key_points"]
+        meta["seo"] = {**meta.get("seo", {}), "primary_keywords": extracted["primary_keywords"]}
+        write_json(meta_path, meta)
+    mutate_workflow_state(article_dir / "workflow_state.json", _mark_extracted)
+    return meta
+
+
 def _make_market_references(article_dir: Path, extracted_meta: Dict[str, Any]) -> Dict[str, Any]:
     theme = extracted_meta.get("title_theme", "AI 写作自动化")
-    system = (
-        "你是检索与信息抽取助手。只针对微信公众号站内内容（mp.weixin.qq.com）输出‘模式摘要’，"
-        "包括标题钩子、结构套路、表达手法；不要返回第三方原文，不要返回与站外域名相关的内容。"
-    )
-    user = (
-        "请基于以下主题生成站内检索Query（包含 site:mp.weixin.qq.com），并给出5-10篇候选文章的‘模式摘要’。\n"
-        f"主题：{theme}\n"
-        "输出JSON：{\n  \"platform\": \"wechat_public\",\n  \"source_domain_whitelist\": [\"mp.weixin.qq.com\"],\n  \"queries\": [],\n  \"candidates\": [ {\"title\":..., \"url\":..., \"title_hooks\":[], \"structural_patterns\":[], \"expression_techniques\":[] } ],\n  \"summary\": { \"top_title_hooks\":[], \"common_structures\":[], \"common_devices\":[] }\n}"
-    )
+    platform = extracted_meta.get("platform", "wechat_public")
+    keywords = extracted_meta.get("seo", {}).get("primary_keywords", [])
+    # 同主题（或近似主题）的文章复用已有的站内模式摘要，省去最慢的一次检索调用
+    version = prompts.prompt_version(MARKET_TEMPLATE)
+    cached = market_cache.lookup(platform, version, theme, keywords)
+    if cached is not None:
+        market, similarity = cached
+        telemetry.record("market_cache", hit=True, similarity=round(similarity, 3))
+        write_json(article_dir / "market_references.json", market)
+        return market
+    telemetry.record("market_cache", hit=False)
     try:
-        market = chat_json(system, user)
+        system, user = prompts.render_pair(
+            MARKET_TEMPLATE,
+            theme=theme,
+            key_points=extracted_meta.get("key_points", []),
+            platform_style=prompts.platform_style(platform),
+        )
+        market = chat_json(system, user, refresh=market_cache.mode() == "refresh")
     except Exception:
+        telemetry.record("fallback", stage="outline.market_refs")
         market = {
             "platform": "wechat_public",
             "source_domain_whitelist": ["mp.weixin.qq.com"],
@@ -68,10 +97,41 @@ def _make_market_references(article_dir: Path, extracted_meta: Dict[str, Any]) -
             "candidates": [],
             "summary": {"top_title_hooks": [], "common_structures": [], "common_devices": []},
         }
+    else:
+        # 兜底结果不入缓存，下一篇同主题文章仍会重新检索
+        market_cache.store(platform, version, theme, keywords, market)
     write_json(article_dir / "market_references.json", market)
     return market
 
 
+def _timed_market_references(article_dir: Path, extracted_meta: Dict[str, Any]) -> Dict[str, Any]:
+    with telemetry.timed("outline.market_refs"):
+        return _make_market_references(article_dir, extracted_meta)
+
+
+def _retrieve_memory_basis(article_dir: Path, extracted_meta: Dict[str, Any], cfg: Dict[str, Any]) -> Dict[str, Any]:
+    # 记忆检索（风格基准）：先增量摄取 Memories/，再按任务要素检索自有Top2 + 标杆TopN
+    mem_cfg = cfg.get("memory", {})
+    try:
+        ingest_memories()
+        basis = retrieve_memory_basis(
+            extracted_meta,
+            own_top_k=int(mem_cfg.get("own_top_k", 2)),
+            reference_top_k=int(mem_cfg.get("reference_top_k", 2)),
+        )
+    except Exception:
+        telemetry.record("fallback", stage="outline.memory")
+        basis = {"own_top2": [], "reference_top2": []}
+    extracted_meta["style_refs"] = {"own_works": basis["own_top2"], "reference_examples": basis["reference_top2"]}
+    write_json(article_dir / "extracted_meta.json", extracted_meta)
+    update_workflow_field(
+        article_dir / "workflow_state.json",
+        "memory_basis",
+        {key: [item["id"] for item in items] for key, items in basis.items()},
+    )
+    return basis
+
+
 def _render_outline(article_dir: Path, extracted_meta: Dict[str, Any], market: Dict[str, Any]) -> None:
     # 根据市场模式摘要生成标题建议与章节骨架（轻量LLM生成可后续接入；现按规则合成）
     title = extracted_meta.get("title_theme", "你的文章标题")
@@ -93,8 +153,13 @@ def _render_outline(article_dir: Path, extracted_meta: Dict[str, Any], market: D
 
 
 def run_outline(article_dir: Path) -> None:
+    with telemetry.article_context(article_dir.name), telemetry.timed("outline"):
+        _run_outline(article_dir)
+
+
+def _run_outline(article_dir: Path) -> None:
     root = Path(__file__).resolve().parents[1]
-    _ = _load_agent_config(root)
+    cfg = _load_agent_config(root)
 
     # 若不存在统一待办清单，则从模板拷贝一份
     checklist = article_dir / "article_creation.md"
@@ -102,15 +167,24 @@ def run_outline(article_dir: Path) -> None:
     if not checklist.exists() and tmpl.exists():
         checklist.write_text(tmpl.read_text(encoding="utf-8"), encoding="utf-8")
 
-    meta = _make_extracted_meta(article_dir)
-    market = _make_market_references(article_dir, meta)
-    _render_outline(article_dir, meta, market)
+    with telemetry.timed("outline.extract_meta"):
+        meta = _make_extracted_meta(article_dir)
+    update_workflow_step(article_dir / "workflow_state.json", "extract_meta", "done")
+    # 市场参考检索（网络）与记忆检索（本地索引）互不依赖：并行执行
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="outline-market") as pool:
+        market_future = telemetry.submit(pool, _timed_market_references, article_dir, meta)
+        with telemetry.timed("outline.memory"):
+            _retrieve_memory_basis(article_dir, meta, cfg)
+        market = market_future.result()
+    with telemetry.timed("outline.render"):
+        _render_outline(article_dir, meta, market)
 
     update_workflow_step(article_dir / "workflow_state.json", "outline", "pending_review")
 
     # 在 checklist 中标记“生成大纲”完成（简单替换方框为已勾选）
     try:
         text = checklist.read_text(encoding="utf-8")
+        text = text.replace("- [ ] 0. 记忆检索与校准完成", "- [x] 0. 记忆检索与校准完成")
         text = text.replace("- [ ] 1. 生成大纲（`article_structure.md`）", "- [x] 1. 生成大纲（`article_structure.md`）")
         checklist.write_text(text, encoding="utf-8")
     except Exception:
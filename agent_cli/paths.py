@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -11,13 +11,22 @@ ARTICLES_ONGOING = ROOT / "Articles" / "进行中"
 def resolve_article_dir(article_title: Optional[str]) -> Path:
     if article_title:
         return ARTICLES_ONGOING / article_title
-    # 默认取“进行中”下最新修改的目录
+    # 默认取注册表中最近更新的文章（仅在“进行中”目录增删文章时才重新扫描）
     if not ARTICLES_ONGOING.exists():
         raise FileNotFoundError("找不到 Articles/进行中 目录，请先创建任务目录")
-    candidates = [p for p in ARTICLES_ONGOING.iterdir() if p.is_dir()]
-    if not candidates:
+    from agent_cli.state import newest_article  # state 依赖本模块，延迟导入避免循环
+
+    newest = newest_article()
+    if newest is None:
         raise FileNotFoundError("进行中目录为空，请先创建文章任务目录")
-    return max(candidates, key=lambda p: p.stat().st_mtime)
+    return newest
+
+
+def list_article_dirs() -> List[Path]:
+    """返回“进行中”下所有文章目录（按名称排序）。"""
+    if not ARTICLES_ONGOING.exists():
+        return []
+    return sorted(p for p in ARTICLES_ONGOING.iterdir() if p.is_dir())
 
 
 def ensure_article_dirs(article_dir: Path) -> None:
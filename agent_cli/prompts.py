@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined, Template
+
+from agent_cli.paths import ROOT
+
+
+# 提示词渲染：进程内共享一个 Environment，模板编译一次后常驻内存（auto_reload 关闭，不再逐次 stat），
+# 编译产物另存 .cache/jinja 供下个进程直接加载；平台风格库每个进程只读一次
+PROMPTS_DIR = ROOT / "Templates" / "prompts"
+STYLES_PATH = ROOT / "Templates" / "platform_styles_lib.json"
+BYTECODE_DIR = ROOT / ".cache" / "jinja"
+
+
+@lru_cache(maxsize=1)
+def _env() -> Environment:
+    BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(str(PROMPTS_DIR)),
+        bytecode_cache=FileSystemBytecodeCache(str(BYTECODE_DIR)),
+        auto_reload=False,
+        undefined=StrictUndefined,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    # 中文原样输出，避免 \uXXXX 转义把提示词撑大数倍
+    env.policies["json.dumps_kwargs"] = {"ensure_ascii": False, "sort_keys": True}
+    return env
+
+
+def _template(name: str) -> Template:
+    return _env().get_template(name)
+
+
+@lru_cache(maxsize=1)
+def _styles_source() -> str:
+    return STYLES_PATH.read_text(encoding="utf-8") if STYLES_PATH.exists() else "{}"
+
+
+@lru_cache(maxsize=1)
+def _styles() -> Dict[str, Any]:
+    return json.loads(_styles_source())
+
+
+def platform_style(platform: str = "wechat_public") -> Dict[str, Any]:
+    """`platform_styles_lib.json` 中某平台的风格配置（不存在时为空字典）。"""
+    return dict(_styles().get(platform, {}))
+
+
+def render(name: str, **context: Any) -> str:
+    return _template(name).render(**context).strip()
+
+
+def render_pair(name: str, **context: Any) -> Tuple[str, str]:
+    """渲染为 (system, user)。模板用 `{% block system %}` / `{% block user %}` 区分两段；
+    没有分块的模板整体作为 user，system 为空串。"""
+    tpl = _template(name)
+    if "user" not in tpl.blocks:
+        return "", tpl.render(**context).strip()
+    ctx = tpl.new_context(context)
+    system = "".join(tpl.blocks["system"](ctx)).strip() if "system" in tpl.blocks else ""
+    return system, "".join(tpl.blocks["user"](ctx)).strip()
+
+
+@lru_cache(maxsize=None)
+def prompt_version(*names: str) -> str:
+    """给定模板（及平台风格库）内容的短哈希；任一模板改动即变化，供检查点与结果缓存作键。"""
+    digest = hashlib.sha256()
+    for name in names:
+        source, _, _ = _env().loader.get_source(_env(), name)
+        digest.update(name.encode("utf-8") + b"\0" + source.encode("utf-8") + b"\0")
+    digest.update(_styles_source().encode("utf-8"))
+    return digest.hexdigest()[:12]
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from agent_cli import telemetry
+
+
+# 文本 LLM 的流量控制，两层：
+# 1) TokenBucket：按“请求数/分钟”“tokens/分钟”限速的令牌桶，状态存于 SQLite，
+#    同一台机器上的多个 agent 进程（batch、watch、手动命令）共享同一份额度；
+# 2) AdaptiveConcurrency：每个供应商在进程内的在途请求上限按 AIMD 调整——成功时缓慢加一，
+#    遇到 429 或延迟突增时减半，供应商恢复后再逐步涨回上限。
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class TokenBucket:
+    """跨进程令牌桶：每分钟补充 per_minute 个令牌，最多积攒 burst_seconds 秒的量。"""
+
+    def __init__(self, db_path: Path, name: str, per_minute: float, burst_seconds: float = 10.0) -> None:
+        self.db_path = db_path
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程使用：每个线程各开一条，事务由 BEGIN IMMEDIATE 在进程间互斥
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _update(self, amount: float, *, wait: bool, floor: Optional[float] = None) -> float:
+        """在一个写事务内补充并扣减令牌；返回还需等待的秒数（0 表示已扣减）。"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            if floor is not None:
+                tokens = min(tokens, floor)
+            # 单次需求超过桶容量时按满桶放行，否则永远等不到
+            need = min(amount, self.capacity)
+            delay = 0.0
+            if wait and tokens < need:
+                delay = (need - tokens) / self.rate
+            else:
+                tokens -= amount
+            conn.execute(
+                "INSERT INTO buckets(name, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (self.name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return delay
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """阻塞直到扣到 amount 个令牌；返回累计等待秒数。"""
+        waited = 0.0
+        while True:
+            delay = self._update(amount, wait=True)
+            if delay <= 0:
+                return waited
+            # 分段等待：其他进程可能先拿走令牌，醒来后重新竞争
+            delay = min(delay, 1.0)
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """不等待地补扣（正数）或退还（负数）令牌，用于按实际用量修正预估。"""
+        if amount:
+            self._update(amount, wait=False)
+
+    def penalize(self, seconds: float) -> None:
+        """供应商返回 429 时清空桶并预支 seconds 秒的额度，所有进程随之一起放慢。"""
+        self._update(self.rate * seconds, wait=False, floor=0.0)
+
+
+class AdaptiveConcurrency:
+    """AIMD 在途请求上限：每个“窗口”（约 limit 次成功）加一，拥塞时乘以 decrease 并冷却一段时间。"""
+
+    def __init__(
+        self,
+        max_limit: int,
+        *,
+        min_limit: int = 1,
+        decrease: float = 0.5,
+        latency_factor: float = 2.5,
+        cooldown: float = 2.0,
+    ) -> None:
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.limit = float(self.max_limit)
+        self._inflight = 0
+        self._cond = threading.Condition()
+        # 流式/非流式各自维护 (短期, 长期) 两条延迟 EWMA（秒）：短期均值持续高于长期基线才算突增，
+        # 单个慢请求（长输出、长尾）不会触发降并发
+        self._latency: Dict[bool, Tuple[float, float]] = {}
+        self._last_decrease = 0.0
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify()
+
+    def on_success(self, latency: float, *, stream: bool = False) -> None:
+        with self._cond:
+            fast, slow = self._latency.get(stream, (latency, latency))
+            fast = fast * 0.7 + latency * 0.3
+            # 长期基线也缓慢吸收新样本：供应商整体变慢后会成为新常态，不会一直降到下限
+            self._latency[stream] = (fast, slow * 0.95 + latency * 0.05)
+            if fast > slow * self.latency_factor:
+                # 延迟突增视为拥塞前兆：降并发
+                self._decrease_locked("latency", latency_ms=round(fast * 1000), baseline_ms=round(slow * 1000))
+                return
+            if self.limit < self.max_limit:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+                self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            self._decrease_locked("throttle")
+
+    def _decrease_locked(self, reason: str, **fields: object) -> None:
+        now = time.monotonic()
+        # 同一次拥塞往往让多个在途请求同时失败，冷却期内只降一次
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        old = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease)
+        if int(self.limit) != int(old):
+            telemetry.record("llm_concurrency", reason=reason, limit=int(self.limit), previous=int(old), **fields)
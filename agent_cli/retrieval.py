@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+
+# 中文没有天然分词边界：对连续汉字取字二元组（单字片段保留单字），英文/数字按词切分并转小写
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff\u3400-\u4dbf]+")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    terms: List[str] = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    terms.extend(w.lower() for w in _WORD.findall(text))
+    return terms
+
+
+def term_counts(text: str) -> Dict[str, int]:
+    return dict(Counter(tokenize(text)))
+
+
+def bm25_idf(n_docs: int, df: int) -> float:
+    return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def bm25_rank(
+    query: str,
+    postings: Mapping[str, Mapping[str, int]],
+    doc_lengths: Mapping[str, int],
+    top_k: int,
+) -> List[Tuple[str, float]]:
+    """按 BM25 对文档打分。
+
+    `postings` 为 {term: {doc_id: tf}}（只需包含查询词），`doc_lengths` 为参与排序的全部文档长度。
+    """
+    n_docs = len(doc_lengths)
+    if n_docs == 0:
+        return []
+    avg_len = sum(doc_lengths.values()) / n_docs or 1.0
+    scores: Dict[str, float] = {}
+    for term in set(tokenize(query)):
+        docs = {d: tf for d, tf in postings.get(term, {}).items() if d in doc_lengths}
+        if not docs:
+            continue
+        idf = bm25_idf(n_docs, len(docs))
+        for doc_id, tf in docs.items():
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc_id] / avg_len)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+
+def build_postings(docs: Iterable[Tuple[str, str]]) -> Tuple[Dict[str, Dict[str, int]], Dict[str, int]]:
+    """内存倒排：输入 (doc_id, text) 序列，返回 (postings, doc_lengths)。"""
+    postings: Dict[str, Dict[str, int]] = {}
+    lengths: Dict[str, int] = {}
+    for doc_id, text in docs:
+        counts = term_counts(text)
+        lengths[doc_id] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, {})[doc_id] = tf
+    return postings, lengths
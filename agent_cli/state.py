@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agent_cli.paths import ARTICLES_ONGOING, list_article_dirs
+
+
+# 文章注册表：记录每篇进行中文章的状态与更新时间，按标题/最新查找无需扫描目录
+REGISTRY_DB = ARTICLES_ONGOING.parent / ".registry.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    title TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    current_step TEXT NOT NULL DEFAULT '',
+    steps TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_updated ON articles(updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    REGISTRY_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(REGISTRY_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _upsert(conn: sqlite3.Connection, article_dir: Path, state: Dict[str, Any], updated_at: float) -> None:
+    conn.execute(
+        "INSERT INTO articles(title, path, current_step, steps, updated_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(title) DO UPDATE SET path = excluded.path, current_step = excluded.current_step, "
+        "steps = excluded.steps, updated_at = excluded.updated_at",
+        (
+            article_dir.name,
+            str(article_dir.resolve()),
+            str(state.get("current_step", "")),
+            json.dumps(state.get("steps", {}), ensure_ascii=False),
+            updated_at,
+        ),
+    )
+
+
+def record_state(article_dir: Path, state: Dict[str, Any]) -> None:
+    """状态写入后同步注册表；只登记“进行中”下的文章，注册表异常不影响主流程。"""
+    if article_dir.parent.resolve() != ARTICLES_ONGOING.resolve():
+        return
+    try:
+        with closing(_connect()) as conn, conn:
+            _upsert(conn, article_dir, state, time.time())
+    except sqlite3.Error:
+        pass
+
+
+def sync_registry(force: bool = False) -> None:
+    """“进行中”目录的 mtime 变化（新建/删除文章目录）时才扫描一次，补登新目录、移除已不存在的条目。"""
+    if not ARTICLES_ONGOING.exists():
+        return
+    dir_mtime = str(ARTICLES_ONGOING.stat().st_mtime_ns)
+    with closing(_connect()) as conn, conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'dir_mtime'").fetchone()
+        if row and row[0] == dir_mtime and not force:
+            return
+        known = {title for (title,) in conn.execute("SELECT title FROM articles")}
+        present = {p.name: p for p in list_article_dirs()}
+        for title in known - set(present):
+            conn.execute("DELETE FROM articles WHERE title = ?", (title,))
+        for title, article_dir in present.items():
+            if title in known and not force:
+                continue
+            state_path = article_dir / "workflow_state.json"
+            try:
+                state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+            except ValueError:
+                state = {}
+            _upsert(conn, article_dir, state, article_dir.stat().st_mtime)
+        conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('dir_mtime', ?)", (dir_mtime,))
+
+
+def newest_article() -> Optional[Path]:
+    sync_registry()
+    with closing(_connect()) as conn:
+        for (path,) in conn.execute("SELECT path FROM articles ORDER BY updated_at DESC"):
+            if Path(path).is_dir():
+                return Path(path)
+    return None
+
+
+def list_articles() -> List[Dict[str, Any]]:
+    """所有登记文章的 {title, path, current_step, steps, updated_at}，按标题排序。"""
+    sync_registry()
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT title, path, current_step, steps, updated_at FROM articles ORDER BY title").fetchall()
+    return [
+        {"title": t, "path": Path(p), "current_step": c, "steps": json.loads(s or "{}"), "updated_at": u}
+        for t, p, c, s, u in rows
+    ]
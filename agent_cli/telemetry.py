@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from agent_cli.paths import ROOT
+from agent_cli.utils import format_table, load_agent_config
+
+
+# 结构化埋点：每条事件一行 JSON，按天写入 logs/telemetry-YYYYMMDD.jsonl（PRD 第13节）
+LOG_DIR = ROOT / "logs"
+
+_article: contextvars.ContextVar[str] = contextvars.ContextVar("telemetry_article", default="")
+_write_lock = threading.Lock()
+_enabled: Optional[bool] = None
+
+
+def _is_enabled() -> bool:
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(load_agent_config().get("telemetry", {}).get("enabled", True))
+    return _enabled
+
+
+@contextmanager
+def article_context(article: str) -> Iterator[None]:
+    """在当前上下文内为所有事件打上文章名。"""
+    token = _article.set(article)
+    try:
+        yield
+    finally:
+        _article.reset(token)
+
+
+def submit(pool: Executor, fn: Callable[..., Any], *args: Any) -> Future:
+    """向线程池提交任务并携带当前上下文（文章名），线程池默认不传递 contextvars。"""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def record(event: str, **fields: Any) -> None:
+    if not _is_enabled():
+        return
+    entry = {"ts": round(time.time(), 3), "event": event, "article": _article.get(), "pid": os.getpid(), **fields}
+    line = json.dumps(entry, ensure_ascii=False)
+    path = LOG_DIR / f"telemetry-{datetime.now():%Y%m%d}.jsonl"
+    try:
+        with _write_lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+    except OSError:
+        # 埋点失败不影响主流程
+        pass
+
+
+@contextmanager
+def timed(stage: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """记录一个阶段的耗时与成败；可在 with 块内向返回的字典追加字段。"""
+    extra: Dict[str, Any] = dict(fields)
+    start = time.monotonic()
+    ok = True
+    try:
+        yield extra
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record("stage", stage=stage, latency_ms=round((time.monotonic() - start) * 1000, 1), ok=ok, **extra)
+
+
+def load_events(days: int = 7) -> List[Dict[str, Any]]:
+    if not LOG_DIR.exists():
+        return []
+    cutoff = time.time() - days * 86400
+    events: List[Dict[str, Any]] = []
+    for path in sorted(LOG_DIR.glob("telemetry-*.jsonl")):
+        if path.stat().st_mtime < cutoff:
+            continue
+        with path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("ts", 0) >= cutoff:
+                    events.append(entry)
+    return events
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法百分位。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _latency_row(name: str, latencies: List[float], **extra: Any) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "count": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        **extra,
+    }
+
+
+def summarize(events: List[Dict[str, Any]], article: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """按阶段、按文章汇总延迟分布，并统计 LLM 调用的缓存命中、重试与兜底次数。"""
+    if article:
+        events = [e for e in events if e.get("article") == article]
+
+    by_stage: Dict[str, List[float]] = {}
+    by_article: Dict[str, List[float]] = {}
+    for e in events:
+        if e.get("event") != "stage":
+            continue
+        by_stage.setdefault(e["stage"], []).append(e["latency_ms"])
+        if e["stage"] in ("outline", "draft") and e.get("article"):
+            by_article.setdefault(f"{e['article']} · {e['stage']}", []).append(e["latency_ms"])
+
+    calls = [e for e in events if e.get("event") == "llm_call"]
+    fallbacks = [e for e in events if e.get("event") == "fallback"]
+    rate_waits = [e["waited_ms"] for e in events if e.get("event") == "llm_rate_wait"]
+    drops = sum(1 for e in events if e.get("event") == "llm_concurrency")
+    hedges = sum(1 for e in events if e.get("event") == "llm_hedge")
+    provider_downs = sum(1 for e in events if e.get("event") == "llm_provider_down")
+    market_lookups = [e for e in events if e.get("event") == "market_cache"]
+    llm: List[Dict[str, Any]] = []
+    if calls:
+        network = [e["latency_ms"] for e in calls if not e.get("cache_hit")]
+        llm.append(
+            _latency_row(
+                "llm_call(网络)",
+                network,
+                cache_hits=sum(1 for e in calls if e.get("cache_hit")),
+                retries=sum(e.get("retries", 0) for e in calls),
+                errors=sum(1 for e in calls if not e.get("ok", True)),
+                prompt_tokens=sum(e.get("prompt_tokens") or 0 for e in calls),
+                completion_tokens=sum(e.get("completion_tokens") or 0 for e in calls),
+                fallbacks=len(fallbacks),
+                rate_waits=len(rate_waits),
+                rate_wait_ms=sum(rate_waits),
+                concurrency_drops=drops,
+                hedges=hedges,
+                provider_downs=provider_downs,
+                market_hits=sum(1 for e in market_lookups if e.get("hit")),
+                market_lookups=len(market_lookups),
+            )
+        )
+    return {
+        "stages": [_latency_row(k, v) for k, v in sorted(by_stage.items())],
+        "articles": [_latency_row(k, v) for k, v in sorted(by_article.items())],
+        "llm": llm,
+    }
+
+
+def format_report(summary: Dict[str, List[Dict[str, Any]]]) -> str:
+    def _ms(v: float) -> str:
+        return f"{v:.0f}"
+
+    parts: List[str] = []
+    header = ("名称", "次数", "p50(ms)", "p95(ms)", "p99(ms)")
+    for title, key in (("按阶段", "stages"), ("按文章", "articles")):
+        rows = [(r["name"], str(r["count"]), _ms(r["p50"]), _ms(r["p95"]), _ms(r["p99"])) for r in summary[key]]
+        if rows:
+            parts.append(f"[{title}]\n" + format_table(header, rows))
+    for r in summary["llm"]:
+        rows = [(r["name"], str(r["count"]), _ms(r["p50"]), _ms(r["p95"]), _ms(r["p99"]))]
+        parts.append(
+            "[LLM调用]\n"
+            + format_table(header, rows)
+            + f"\n缓存命中 {r['cache_hits']}，重试 {r['retries']}，失败 {r['errors']}，兜底 {r['fallbacks']}，"
+            f"tokens 提示 {r['prompt_tokens']} / 生成 {r['completion_tokens']}\n"
+            f"限速等待 {r['rate_waits']} 次（共 {r['rate_wait_ms'] / 1000:.1f} s），并发上限下调 {r['concurrency_drops']} 次，"
+            f"对冲请求 {r['hedges']} 次，供应商熔断 {r['provider_downs']} 次，"
+            f"市场参考缓存命中 {r['market_hits']}/{r['market_lookups']}"
+        )
+    return "\n\n".join(parts) if parts else "暂无埋点数据（logs/ 为空）"
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from agent_cli.retrieval import bm25_rank, build_postings
+from agent_cli.utils import read_json, write_json
+
+
+DEFAULT_CHUNK_CHARS = 400
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;])")
+
+# 口语填充词（含其后的停顿标点）与紧邻重复的短语（“我们我们” → “我们”）。
+# 重复只按 2-4 个汉字计：数字、英文（年份、金额、型号）原样保留，单字叠词（“谢谢”“看看”）也不动
+_FILLER = re.compile(r"(?:嗯+|呃+|额+|那个那个|就是说就是说)[，,、…\s]*")
+_STUTTER = re.compile(r"([\u4e00-\u9fff]{2,4}?)\1+")
+
+
+def latest_transcript_path(article_dir: Path) -> Optional[Path]:
+    """`Materials/` 下最新修改的 transcript.*.txt / .md。"""
+    materials = article_dir / "Materials"
+    if not materials.exists():
+        return None
+    candidates = [p for p in materials.glob("transcript.*.*") if p.suffix in {".txt", ".md"}]
+    return max(candidates, key=lambda p: p.stat().st_mtime) if candidates else None
+
+
+def clean_line(line: str) -> str:
+    """去掉口语填充与口吃重复；数字与英文不受影响。
+
+    >>> clean_line("嗯，我们我们在2020年发布了产品")
+    '我们在2020年发布了产品'
+    >>> clean_line("成本从1010元降到500元，用的是4o4o")
+    '成本从1010元降到500元，用的是4o4o'
+    """
+    line = _FILLER.sub("", line.strip())
+    return _STUTTER.sub(r"\1", line)
+
+
+def iter_clean_chunks(path: Path, chunk_chars: int) -> Iterator[str]:
+    """逐行流式读取转写稿：清理口语填充与重复行，按约 `chunk_chars` 字切块产出。
+
+    只去掉与上一行完全相同的行（语音识别的重复输出）；访谈中隔行出现的“对。”“是的。”等短句照常保留。
+    """
+    previous = ""
+    buf: List[str] = []
+    size = 0
+    with path.open("r", encoding="utf-8", errors="ignore") as fh:
+        for raw in fh:
+            line = clean_line(raw)
+            if not line:
+                continue
+            if line == previous:
+                continue
+            previous = line
+            if buf and size + len(line) > chunk_chars:
+                yield "\n".join(buf)
+                buf, size = [], 0
+            buf.append(line)
+            size += len(line) + 1
+    if buf:
+        yield "\n".join(buf)
+
+
+def chunk_transcript(text: str, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> List[str]:
+    """按段落切块，相邻短段合并到 `chunk_chars` 左右；超长段落再按句末标点切开。"""
+    pieces: List[str] = []
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= chunk_chars:
+            pieces.append(para)
+            continue
+        buf = ""
+        for sent in _SENTENCE_END.split(para):
+            if buf and len(buf) + len(sent) > chunk_chars:
+                pieces.append(buf)
+                buf = ""
+            buf += sent
+        if buf:
+            pieces.append(buf)
+
+    chunks: List[str] = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) + 1 <= chunk_chars:
+            chunks[-1] = chunks[-1] + "\n" + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def build_index(text: str, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> Dict[str, Any]:
+    chunks = chunk_transcript(text, chunk_chars)
+    postings, lengths = build_postings((str(i), c) for i, c in enumerate(chunks))
+    return {"chunks": chunks, "postings": postings, "lengths": lengths}
+
+
+def load_or_build_index(article_dir: Path, text: str, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> Dict[str, Any]:
+    """转写稿切块与倒排按文章缓存于 `.cache/transcript_index.json`，转写内容或块大小变化时重建。"""
+    cache_path = article_dir / ".cache" / "transcript_index.json"
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    cached = read_json(cache_path)
+    if cached.get("sha256") == digest and cached.get("chunk_chars") == chunk_chars:
+        return cached
+    index = build_index(text, chunk_chars)
+    index.update({"sha256": digest, "chunk_chars": chunk_chars})
+    write_json(cache_path, index)
+    return index
+
+
+def select_excerpt(index: Dict[str, Any], query: str, budget_chars: int) -> str:
+    """取与 `query` 最相关的若干块，总长不超过 `budget_chars`，按原文顺序拼接。
+
+    没有任何命中时退回开头的若干块。
+    """
+    chunks: List[str] = index.get("chunks", [])
+    if not chunks:
+        return ""
+    ranked = bm25_rank(query, index["postings"], index["lengths"], top_k=len(chunks))
+    order = [int(doc_id) for doc_id, _ in ranked] or list(range(len(chunks)))
+
+    picked: List[int] = []
+    used = 0
+    for i in order:
+        size = len(chunks[i]) + 1
+        if used + size > budget_chars:
+            continue
+        picked.append(i)
+        used += size
+    if not picked:
+        # 单块就超出预算：截取最相关块的开头
+        return chunks[order[0]][:budget_chars]
+    return "\n".join(chunks[i] for i in sorted(picked))
+
+
+def excerpt_for(index: Optional[Dict[str, Any]], text: str, query: str, budget_chars: int) -> str:
+    """有切块倒排时按相关度选取片段，否则截取原文开头。"""
+    if index is None:
+        return text[:budget_chars]
+    return select_excerpt(index, query, budget_chars)
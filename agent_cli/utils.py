@@ -1,8 +1,21 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterator, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows 下无 flock，退化为不加锁
+    fcntl = None  # type: ignore[assignment]
+
+from agent_cli import state as registry
+from agent_cli.paths import ROOT
 
 
 def read_json(path: Path) -> Dict[str, Any]:
@@ -21,13 +34,90 @@ def write_text_file(path: Path, content: str) -> None:
     path.write_text(content, encoding="utf-8")
 
 
+def write_text_atomic(path: Path, content: str) -> None:
+    """先写同目录临时文件再原子重命名，读者不会看到写了一半的文件。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _default_state() -> Dict[str, Any]:
+    return {"current_step": "", "steps": {}, "checkpoints": {"last_chapter_done": 0}}
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """对 `path` 旁的 `.<name>.lock` 加 flock 实现跨进程互斥（同进程不同线程各自 open，同样互斥）。"""
+    lock_path = path.with_name(f".{path.name}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def mutate_workflow_state(workflow_path: Path, mutate: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """在文件锁内读-改-写 workflow_state.json，原子重命名落盘，并同步文章注册表。"""
+    with file_lock(workflow_path):
+        state = read_json(workflow_path) or _default_state()
+        mutate(state)
+        state.setdefault("timestamps", {})["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        write_text_atomic(workflow_path, json.dumps(state, ensure_ascii=False, indent=2))
+    registry.record_state(workflow_path.parent, state)
+    return state
+
+
 def update_workflow_step(workflow_path: Path, step_key: str, status: str) -> None:
-    state = read_json(workflow_path)
-    if not state:
-        state = {"current_step": "", "steps": {}, "checkpoints": {"last_chapter_done": 0}}
-    steps = state.setdefault("steps", {})
-    steps[step_key] = status
-    state["current_step"] = step_key
-    write_json(workflow_path, state)
+    def _mutate(state: Dict[str, Any]) -> None:
+        state.setdefault("steps", {})[step_key] = status
+        state["current_step"] = step_key
+
+    mutate_workflow_state(workflow_path, _mutate)
+
+
+def update_workflow_checkpoint(workflow_path: Path, name: str, value: Any) -> None:
+    def _mutate(state: Dict[str, Any]) -> None:
+        state.setdefault("checkpoints", {})[name] = value
+
+    mutate_workflow_state(workflow_path, _mutate)
+
+
+def update_workflow_field(workflow_path: Path, key: str, value: Any) -> None:
+    """写入 workflow_state.json 的顶层字段（如 memory_basis）。"""
+    def _mutate(state: Dict[str, Any]) -> None:
+        state[key] = value
+
+    mutate_workflow_state(workflow_path, _mutate)
+
+
+def load_agent_config() -> Dict[str, Any]:
+    """读取全局配置 `config/agent_config.json`（不存在时返回空字典）。"""
+    return read_json(ROOT / "config" / "agent_config.json")
+
+
+def _display_width(text: str) -> int:
+    # 中文等全角字符在终端占两列
+    return sum(2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1 for ch in text)
 
 
+def format_table(header: Sequence[str], rows: Sequence[Sequence[str]]) -> str:
+    """渲染等宽对齐的纯文本表格（兼容中文列宽）。"""
+    widths = [max(_display_width(str(row[i])) for row in [header, *rows]) for i in range(len(header))]
+    lines = [
+        "  ".join(str(cell) + " " * (widths[i] - _display_width(str(cell))) for i, cell in enumerate(row)).rstrip()
+        for row in [header, *rows]
+    ]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
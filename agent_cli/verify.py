@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent_cli import prompts, telemetry
+from agent_cli.llm_perplexity import chat_json
+from agent_cli.paths import ROOT
+from agent_cli.utils import load_agent_config, read_json, write_json, write_text_atomic
+
+
+# 分章事实核查：每章抽取断言 → 跨章归一化去重 → 多条断言打包成一次核查请求并发执行 → 按章出报告
+# 判定结果按“归一化断言文本”全局缓存，核查提示词模板的内容哈希参与缓存键，改模板即失效
+VERIFY_TEMPLATE = "verify_batch_prompt.j2"
+VERDICT_DIR = ROOT / ".cache" / "verdicts"
+
+# 低于该可信度的断言标记为需复审（按 verification.strictness）
+REVIEW_THRESHOLDS = {"relaxed": 0.4, "normal": 0.6, "strict": 0.75}
+VERDICTS = ("supported", "refuted", "unverifiable")
+
+_CHAPTER_CHARS = 6000
+_SENTENCE = re.compile(r"[^。！？!?\n]+[。！？!?]?")
+_RISKY = (
+    ("numeric", re.compile(r"\d+(?:\.\d+)?\s*(?:%|％|倍|万|亿|千|百|个|人|次|元)")),
+    ("date", re.compile(r"(?:19|20)\d{2}\s*年|\d{1,2}\s*月\s*\d{1,2}\s*日")),
+    ("quote", re.compile(r"[“\"「][^”\"」]{4,}[”\"」]")),
+    ("causal", re.compile(r"因为|由于|导致|因此|所以|使得")),
+)
+
+
+def _verify_config() -> Dict[str, Any]:
+    cfg = load_agent_config().get("verification", {})
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "strictness": str(cfg.get("strictness", "normal")),
+        "source_whitelist": [str(s) for s in cfg.get("source_whitelist", [])],
+        "batch_size": max(1, int(cfg.get("batch_size", 8))),
+        "workers": max(1, int(cfg.get("workers", 4))),
+        "max_assertions_per_chapter": int(cfg.get("max_assertions_per_chapter", 12)),
+        "cache_ttl_seconds": int(cfg.get("cache_ttl_seconds", 30 * 86400)),
+    }
+
+
+def normalize_assertion(text: str) -> str:
+    """归一化断言文本作为去重与缓存的键：全半角统一、小写、压缩空白、去掉首尾标点。"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .,;:!?、。，；：！？\"'“”‘’")
+
+
+def split_chapters(draft: str) -> List[Tuple[str, str]]:
+    """按二级标题把成稿切成 [(章节标题, 正文)]；首个二级标题之前的引言记为“引言”。"""
+    chapters: List[Tuple[str, str]] = []
+    title = "引言"
+    buf: List[str] = []
+    for ln in draft.splitlines():
+        if ln.startswith("## "):
+            chapters.append((title, "\n".join(buf).strip()))
+            title, buf = ln[3:].strip(), []
+        elif not ln.startswith("# "):
+            buf.append(ln)
+    chapters.append((title, "\n".join(buf).strip()))
+    return [(t, body) for t, body in chapters if body]
+
+
+def _rule_based_assertions(text: str) -> List[Dict[str, Any]]:
+    # 模型不可用时按正则挑出含数字/时间/引语/因果词的句子
+    found: List[Dict[str, Any]] = []
+    for sent in _SENTENCE.findall(text):
+        sent = sent.strip()
+        for kind, pattern in _RISKY:
+            if len(sent) >= 8 and pattern.search(sent):
+                found.append({"type": kind, "text": sent, "importance": 3 if kind in ("numeric", "date") else 2})
+                break
+    return found
+
+
+def _extract_assertions(text: str, limit: int) -> List[Dict[str, Any]]:
+    try:
+        system, user = prompts.render_pair("verify_assertions_prompt.j2", chapter_text=text[:_CHAPTER_CHARS])
+        result = chat_json(system, user, temperature=0.0)
+        raw = result.get("assertions", []) if isinstance(result, dict) else []
+        assertions = [
+            {
+                "type": str(a.get("type", "entity")),
+                "text": str(a.get("text", "")).strip(),
+                "importance": min(3, max(1, int(a.get("importance", 2)))),
+            }
+            for a in raw
+            if isinstance(a, dict) and str(a.get("text", "")).strip()
+        ]
+    except Exception:
+        telemetry.record("fallback", stage="verify.extract")
+        assertions = _rule_based_assertions(text)
+    # 重要度高的优先，单章断言数量有上限
+    assertions.sort(key=lambda a: -a["importance"])
+    return assertions[:limit]
+
+
+def _verdict_path(norm: str, whitelist: List[str]) -> Path:
+    key = hashlib.sha256(f"{prompts.prompt_version(VERIFY_TEMPLATE)}\n{','.join(sorted(whitelist))}\n{norm}".encode("utf-8")).hexdigest()[:32]
+    return VERDICT_DIR / f"{key}.json"
+
+
+def _cached_verdict(norm: str, cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        cached = read_json(_verdict_path(norm, cfg["source_whitelist"]))
+    except ValueError:
+        return None
+    if not cached or time.time() - cached.get("verified_at", 0) > cfg["cache_ttl_seconds"]:
+        return None
+    return cached
+
+
+def _unverified() -> Dict[str, Any]:
+    return {"verdict": "unverifiable", "confidence": None, "evidence": [], "suggestion": ""}
+
+
+def _verify_batch(items: List[Tuple[str, str]], cfg: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """一次请求核查多条断言；返回 {归一化文本: 判定}。缺失或解析失败的条目不缓存，下次运行重试。"""
+    try:
+        system, user = prompts.render_pair(
+            VERIFY_TEMPLATE, source_whitelist=cfg["source_whitelist"], assertions=[text for _, text in items]
+        )
+        result = chat_json(system, user, temperature=0.0)
+        rows = result.get("verdicts", []) if isinstance(result, dict) else []
+    except Exception:
+        telemetry.record("fallback", stage="verify.batch", size=len(items))
+        return {norm: _unverified() for norm, _ in items}
+
+    by_id: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        try:
+            by_id[int(row["id"])] = row
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    out: Dict[str, Dict[str, Any]] = {}
+    for i, (norm, _) in enumerate(items, start=1):
+        row = by_id.get(i)
+        try:
+            verdict = {
+                "verdict": row["verdict"] if row["verdict"] in VERDICTS else "unverifiable",
+                "confidence": round(min(1.0, max(0.0, float(row["confidence"]))), 2),
+                "evidence": [
+                    {"source": str(e.get("source", "")), "snippet": str(e.get("snippet", ""))[:120]}
+                    for e in row.get("evidence", [])[:2]
+                    if isinstance(e, dict)
+                ],
+                "suggestion": str(row.get("suggestion") or ""),
+            }
+        except (KeyError, TypeError, ValueError):
+            telemetry.record("fallback", stage="verify.batch")
+            out[norm] = _unverified()
+            continue
+        write_text_atomic(
+            _verdict_path(norm, cfg["source_whitelist"]),
+            json.dumps({**verdict, "normalized": norm, "verified_at": time.time()}, ensure_ascii=False),
+        )
+        out[norm] = verdict
+    return out
+
+
+def _chapter_report(idx: int, title: str, assertions: List[Dict[str, Any]], threshold: float) -> Dict[str, Any]:
+    verified = [a for a in assertions if a["confidence"] is not None]
+    weight = sum(a["importance"] for a in verified)
+    if not assertions:
+        score: Optional[float] = 1.0
+    elif weight:
+        score = round(sum(a["importance"] * a["confidence"] for a in verified) / weight, 2)
+    else:
+        score = None
+    rewrites = [
+        {"from": a["text"], "to": a["suggestion"], "reason": "与来源矛盾" if a["verdict"] == "refuted" else "证据不足"}
+        for a in assertions
+        if a["needs_review"] and a["suggestion"]
+    ]
+    return {
+        "chapter": idx,
+        "title": title,
+        "score": score,
+        "threshold": threshold,
+        "assertions": assertions,
+        "rewrites": rewrites,
+    }
+
+
+def _write_summary(report_dir: Path, reports: List[Dict[str, Any]], stats: Dict[str, int]) -> None:
+    lines = [
+        "# 文本审稿包摘要",
+        "",
+        f"- 断言 {stats['assertions']} 条（去重后 {stats['unique']} 条，缓存命中 {stats['cached']} 条，"
+        f"核查请求 {stats['batches']} 次）；需复审 {stats['flagged']} 条",
+        "- 下一步：`agent approve-draft-text` 触发配图→转HTML→上传草稿",
+        "",
+        "| 章节 | 标题 | 断言数 | 得分 | 需复审 |",
+        "| --- | --- | --- | --- | --- |",
+    ]
+    for r in reports:
+        score = "未核查" if r["score"] is None else f"{r['score']:.2f}"
+        flagged = sum(1 for a in r["assertions"] if a["needs_review"])
+        lines.append(f"| {r['chapter']:02d} | {r['title']} | {len(r['assertions'])} | {score} | {flagged} |")
+
+    review = [(r["chapter"], a) for r in reports for a in r["assertions"] if a["needs_review"]]
+    if review:
+        lines += ["", "## 需复审断言", ""]
+        for chapter, a in review:
+            conf = "未核查" if a["confidence"] is None else f"{a['confidence']:.2f}"
+            lines.append(f"- [{chapter:02d}] {a['text']}（{a['verdict']}，可信度 {conf}）")
+            if a["suggestion"]:
+                lines.append(f"  - 建议改写：{a['suggestion']}")
+    write_text_atomic(report_dir / "summary.md", "\n".join(lines) + "\n")
+
+
+def verify_draft(article_dir: Path, draft: str) -> Dict[str, int]:
+    """核查成稿并写出 `verification_reports/chapter-XX.json` 与 `summary.md`，返回计数。
+
+    各章断言抽取并发进行；每抽完一章就把新出现且未缓存的断言攒入待核查队列，
+    满 `batch_size` 条即提交一次核查请求，抽取与核查流水并行。
+    """
+    cfg = _verify_config()
+    threshold = REVIEW_THRESHOLDS.get(cfg["strictness"], REVIEW_THRESHOLDS["normal"])
+    chapters = split_chapters(draft)
+    per_chapter: List[List[Dict[str, Any]]] = [[] for _ in chapters]
+    verdicts: Dict[str, Optional[Dict[str, Any]]] = {}
+    pending: List[Tuple[str, str]] = []
+    batches: List[Future] = []
+    stats = {"assertions": 0, "unique": 0, "cached": 0, "batches": 0, "flagged": 0}
+
+    with ThreadPoolExecutor(max_workers=cfg["workers"]) as pool:
+
+        def _flush() -> None:
+            batches.append(telemetry.submit(pool, _verify_batch, list(pending), cfg))
+            pending.clear()
+
+        extracting = {
+            telemetry.submit(pool, _extract_assertions, body, cfg["max_assertions_per_chapter"]): idx
+            for idx, (_, body) in enumerate(chapters)
+        }
+        for future in as_completed(extracting):
+            idx = extracting[future]
+            seen_in_chapter = set()
+            for a in future.result():
+                norm = normalize_assertion(a["text"])
+                if not norm or norm in seen_in_chapter:
+                    continue
+                seen_in_chapter.add(norm)
+                per_chapter[idx].append({**a, "normalized": norm})
+                if norm in verdicts:
+                    continue
+                cached = _cached_verdict(norm, cfg)
+                verdicts[norm] = cached
+                if cached is not None:
+                    stats["cached"] += 1
+                    continue
+                pending.append((norm, a["text"]))
+                if len(pending) >= cfg["batch_size"]:
+                    _flush()
+        if pending:
+            _flush()
+        for future in batches:
+            verdicts.update(future.result())
+
+    stats["unique"] = len(verdicts)
+    stats["batches"] = len(batches)
+    reports: List[Dict[str, Any]] = []
+    for idx, ((title, _), assertions) in enumerate(zip(chapters, per_chapter)):
+        rows = []
+        for a in assertions:
+            v = verdicts.get(a["normalized"]) or _unverified()
+            conf = v["confidence"]
+            needs_review = conf is None or conf < threshold or v["verdict"] == "refuted"
+            rows.append(
+                {
+                    "type": a["type"],
+                    "text": a["text"],
+                    "importance": a["importance"],
+                    "verdict": v["verdict"],
+                    "confidence": conf,
+                    "evidence": v["evidence"],
+                    "suggestion": v["suggestion"],
+                    "needs_review": needs_review,
+                }
+            )
+        stats["assertions"] += len(rows)
+        stats["flagged"] += sum(1 for r in rows if r["needs_review"])
+        reports.append(_chapter_report(idx, title, rows, threshold))
+
+    report_dir = article_dir / "verification_reports"
+    keep = {f"chapter-{r['chapter']:02d}.json" for r in reports}
+    for old in report_dir.glob("chapter-*.json"):
+        if old.name not in keep:
+            old.unlink(missing_ok=True)
+    for r in reports:
+        write_json(report_dir / f"chapter-{r['chapter']:02d}.json", r)
+    _write_summary(report_dir, reports, stats)
+    return stats
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agent_cli import telemetry
+from agent_cli.memory import MEMORIES_DIR, SOURCES, SUPPORTED_SUFFIXES, ingest_memories
+from agent_cli.paths import ARTICLES_ONGOING
+from agent_cli.utils import load_agent_config
+
+
+# 监听模式（PRD 第14节）：常驻进程订阅文件系统事件（Linux 下为 inotify，非轮询），
+# 一段时间内的连续写入合并为一次任务，只重跑受影响的阶段；LLM 连接池、模板与各级缓存在多次任务间保持热状态
+#   Articles/进行中/<文章>/Materials/transcript.* → 重新提炼该文章的 extracted_meta.json
+#   Memories/Contents|Examples/**                 → 增量更新记忆索引
+Job = Tuple[str, str]  # ("meta", 文章名) | ("memory", "")
+
+
+class WatchError(RuntimeError):
+    pass
+
+
+def _watch_config() -> Dict[str, Any]:
+    cfg = load_agent_config()
+    watch = cfg.get("watch", {})
+    return {
+        "debounce_seconds": float(watch.get("debounce_seconds", 2.0)),
+        "max_wait_seconds": float(watch.get("max_wait_seconds", 30.0)),
+        "patterns": list(cfg.get("ingestion", {}).get("primary_file_pattern", ["transcript.*.txt", "transcript.*.md"])),
+    }
+
+
+def classify(path: Path, patterns: List[str]) -> Optional[Job]:
+    """把变动的文件映射为需要重跑的任务；与任何阶段无关的文件返回 None。"""
+    try:
+        parts = path.relative_to(ARTICLES_ONGOING).parts
+    except ValueError:
+        pass
+    else:
+        if len(parts) == 3 and parts[1] == "Materials" and any(fnmatch.fnmatch(parts[2], p) for p in patterns):
+            return ("meta", parts[0])
+        return None
+    try:
+        parts = path.relative_to(MEMORIES_DIR).parts
+    except ValueError:
+        return None
+    # .ingested/ 与 memory_indexing.json 由摄取本身写出，须排除，否则会自我触发
+    sources = {subdir for subdir, _ in SOURCES.values()}
+    if len(parts) >= 2 and parts[0] in sources and not any(p.startswith(".") for p in parts):
+        if path.suffix.lower() in SUPPORTED_SUFFIXES:
+            return ("memory", "")
+    return None
+
+
+class _Debouncer:
+    """按任务合并事件：安静 debounce 秒后触发；持续写入时最迟 max_wait 秒也会触发一次。"""
+
+    def __init__(self, debounce: float, max_wait: float) -> None:
+        self._debounce = debounce
+        self._max_wait = max_wait
+        self._pending: Dict[Job, Tuple[float, float]] = {}  # 任务 → (首次事件时间, 最近事件时间)
+        self._cond = threading.Condition()
+
+    def add(self, job: Job) -> None:
+        now = time.monotonic()
+        with self._cond:
+            first, _ = self._pending.get(job, (now, now))
+            self._pending[job] = (first, now)
+            self._cond.notify()
+
+    def _due_at(self, first: float, last: float) -> float:
+        return min(last + self._debounce, first + self._max_wait)
+
+    def take(self, stop: threading.Event, poll: float = 0.5) -> List[Job]:
+        """阻塞到有任务到期（或 stop 被置位），按到期先后返回并移出队列。"""
+        with self._cond:
+            while not stop.is_set():
+                now = time.monotonic()
+                due = sorted((self._due_at(*t), job) for job, t in self._pending.items())
+                ready = [job for at, job in due if at <= now]
+                if ready:
+                    for job in ready:
+                        del self._pending[job]
+                    return ready
+                self._cond.wait(min(poll, due[0][0] - now) if due else poll)
+        return []
+
+
+class _Handler:
+    # watchdog 只调用 dispatch()，无需继承 FileSystemEventHandler，本模块因此可在未安装 watchdog 时导入
+    def __init__(self, debouncer: _Debouncer, patterns: List[str]) -> None:
+        self._debouncer = debouncer
+        self._patterns = patterns
+
+    def dispatch(self, event: Any) -> None:
+        if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+            return
+        for raw in (event.src_path, getattr(event, "dest_path", "")):
+            if not raw:
+                continue
+            job = classify(Path(os.fsdecode(raw)), self._patterns)
+            if job is not None:
+                self._debouncer.add(job)
+
+
+def _run_job(job: Job, log: Callable[[str], None]) -> None:
+    kind, name = job
+    try:
+        if kind == "memory":
+            with telemetry.timed("watch.memory") as ev:
+                stats = ingest_memories()
+                ev.update(stats)
+            log(f"[watch] 记忆索引：新增 {stats['added']}，更新 {stats['updated']}，删除 {stats['removed']}")
+            return
+        article_dir = ARTICLES_ONGOING / name
+        if not article_dir.is_dir():
+            return
+        # 延迟导入：outline 依赖 LLM 客户端，仅在首次需要提炼要素时加载
+        from agent_cli.outline import refresh_extracted_meta
+
+        with telemetry.article_context(name), telemetry.timed("watch.meta"):
+            meta = refresh_extracted_meta(article_dir)
+        log(f"[watch] {name}：已重新提炼要素（主题：{meta.get('title_theme', '')}）")
+    except Exception as exc:
+        telemetry.record("watch.error", job=kind, target=name, error=str(exc)[:200])
+        log(f"[watch] {kind} {name} 失败：{exc}")
+
+
+def run_watch(log: Callable[[str], None], stop: Optional[threading.Event] = None) -> None:
+    """前台常驻：订阅文件事件并串行执行合并后的任务，直到 stop 被置位、收到 SIGTERM 或 Ctrl+C。"""
+    try:
+        from watchdog.observers import Observer  # 可选依赖，仅监听模式需要
+    except ImportError:
+        raise WatchError("监听模式需要 watchdog：pip install watchdog")
+
+    cfg = _watch_config()
+    roots = [p for p in (ARTICLES_ONGOING, MEMORIES_DIR) if p.is_dir()]
+    if not roots:
+        raise WatchError("找不到 Articles/进行中 或 Memories 目录")
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        # 作为服务运行时（systemd/supervisor 发 SIGTERM）也能停止监听并退出
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    debouncer = _Debouncer(cfg["debounce_seconds"], cfg["max_wait_seconds"])
+    handler = _Handler(debouncer, cfg["patterns"])
+    observer = Observer()
+    for root in roots:
+        observer.schedule(handler, str(root), recursive=True)
+    observer.start()
+    log(f"[watch] 正在监听：{'、'.join(str(p) for p in roots)}（Ctrl+C 退出）")
+    try:
+        # 先补一次增量摄取，覆盖未监听期间的记忆变动
+        _run_job(("memory", ""), log)
+        while not stop.is_set():
+            for job in debouncer.take(stop):
+                _run_job(job, log)
+    finally:
+        observer.stop()
+        observer.join()
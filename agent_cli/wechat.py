@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from markdown_it import MarkdownIt
+from requests.adapters import HTTPAdapter
+
+from agent_cli import telemetry
+from agent_cli.approve import tick_checklist
+from agent_cli.paths import ROOT
+from agent_cli.utils import (
+    file_lock,
+    load_agent_config,
+    read_json,
+    update_workflow_step,
+    write_text_atomic,
+)
+
+
+# 公众号草稿上传（PRD 第9步）：Markdown→HTML，正文图片并行 uploadimg、封面 add_material，最后 draft/add
+# access_token 全局缓存于 .cache/wechat_token.json，临近过期才在文件锁内刷新（微信对取 token 有频率限制）
+DEFAULT_BASE_URL = "https://api.weixin.qq.com"
+TOKEN_CACHE = ROOT / ".cache" / "wechat_token.json"
+WECHAT_CONFIG = ROOT / "config" / "wechat_config.json"
+
+# token 失效类错误码：作废缓存并重取一次；系统繁忙与频率限制：退避重试
+TOKEN_ERRCODES = {40001, 40014, 42001}
+RETRYABLE_ERRCODES = {-1, 45009, 45011}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class WechatError(RuntimeError):
+    pass
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_token_lock = threading.Lock()
+
+
+def _wechat_config() -> Dict[str, Any]:
+    cfg = load_agent_config().get("wechat", {})
+    account = read_json(WECHAT_CONFIG)
+    return {
+        "base_url": (os.environ.get("WECHAT_API_BASE_URL") or cfg.get("base_url") or DEFAULT_BASE_URL).rstrip("/"),
+        "appid": os.environ.get("WECHAT_APPID") or account.get("appid", ""),
+        "appsecret": os.environ.get("WECHAT_APPSECRET") or account.get("appsecret", ""),
+        "draft_default": account.get("draft_default", {}),
+        "upload_concurrency": max(1, int(cfg.get("upload_concurrency", 4))),
+        "timeout": float(cfg.get("timeout", 30)),
+        "max_retries": int(cfg.get("max_retries", 3)),
+        "token_refresh_margin": int(cfg.get("token_refresh_margin", 300)),
+    }
+
+
+def _get_session(pool_size: int) -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _cached_token(cfg: Dict[str, Any]) -> Optional[str]:
+    try:
+        cached = read_json(TOKEN_CACHE)
+    except ValueError:
+        return None
+    if cached.get("appid") != cfg["appid"] or cached.get("expires_at", 0) - cfg["token_refresh_margin"] <= time.time():
+        return None
+    return cached.get("access_token")
+
+
+def get_access_token(cfg: Dict[str, Any], *, stale: Optional[str] = None) -> str:
+    """返回可用的 access_token：优先读磁盘缓存，临近过期或被判失效（`stale`）时在锁内刷新。
+
+    刷新前在锁内再读一次缓存：并发线程/进程中只有第一个真正请求微信，其余直接复用新 token。
+    """
+    token = _cached_token(cfg)
+    if token and token != stale:
+        return token
+    if not cfg["appid"] or not cfg["appsecret"]:
+        raise WechatError("缺少公众号 appid/appsecret（config/wechat_config.json 或 WECHAT_APPID/WECHAT_APPSECRET）")
+    with _token_lock, file_lock(TOKEN_CACHE):
+        token = _cached_token(cfg)
+        if token and token != stale:
+            return token
+        try:
+            resp = _get_session(cfg["upload_concurrency"]).get(
+                f"{cfg['base_url']}/cgi-bin/token",
+                params={"grant_type": "client_credential", "appid": cfg["appid"], "secret": cfg["appsecret"]},
+                timeout=cfg["timeout"],
+            )
+            data = resp.json()
+        except (requests.RequestException, ValueError) as exc:
+            # 网络错误或非 JSON 错误页：转为 WechatError，由 CLI 输出可读信息
+            raise WechatError(f"获取 access_token 失败: {exc}") from exc
+        if not isinstance(data, dict) or "access_token" not in data:
+            raise WechatError(f"获取 access_token 失败: {data}")
+        telemetry.record("wechat_token_refresh")
+        write_text_atomic(
+            TOKEN_CACHE,
+            json.dumps(
+                {
+                    "appid": cfg["appid"],
+                    "access_token": data["access_token"],
+                    "expires_at": time.time() + int(data.get("expires_in", 7200)),
+                },
+                ensure_ascii=False,
+            ),
+        )
+        return data["access_token"]
+
+
+def _call(
+    cfg: Dict[str, Any],
+    path: str,
+    *,
+    params: Optional[Dict[str, str]] = None,
+    files: Optional[Dict[str, Any]] = None,
+    body: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """带 access_token 调用微信接口：token 失效时刷新重试一次，繁忙/限流/5xx/网络错误按退避重试。"""
+    session = _get_session(cfg["upload_concurrency"])
+    token = get_access_token(cfg)
+    refreshed = False
+    attempt = 0
+    while True:
+        query = {**(params or {}), "access_token": token}
+        try:
+            if body is not None:
+                # 中文须原样发送：默认的 \uXXXX 转义会被微信原样显示在草稿里
+                resp = session.post(
+                    f"{cfg['base_url']}{path}",
+                    params=query,
+                    data=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+                    headers={"Content-Type": "application/json; charset=utf-8"},
+                    timeout=cfg["timeout"],
+                )
+            else:
+                resp = session.post(f"{cfg['base_url']}{path}", params=query, files=files, timeout=cfg["timeout"])
+            if resp.status_code in RETRYABLE_STATUS:
+                data: Dict[str, Any] = {"errcode": -1, "errmsg": f"HTTP {resp.status_code}"}
+            else:
+                data = resp.json()
+        except (requests.ConnectionError, requests.Timeout, ValueError) as exc:
+            data = {"errcode": -1, "errmsg": str(exc)}
+        errcode = data.get("errcode", 0)
+        if not errcode:
+            return data
+        if errcode in TOKEN_ERRCODES and not refreshed:
+            token = get_access_token(cfg, stale=token)
+            refreshed = True
+            continue
+        if errcode in RETRYABLE_ERRCODES and attempt < cfg["max_retries"]:
+            attempt += 1
+            time.sleep(min(10.0, 0.5 * 2 ** attempt))
+            continue
+        raise WechatError(f"微信接口 {path} 错误: {data}")
+
+
+def _upload_image(cfg: Dict[str, Any], path: Path, *, cover: bool) -> Dict[str, Any]:
+    mime = "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
+    files = {"media": (path.name, path.read_bytes(), mime)}
+    if cover:
+        # 封面走永久素材，返回 media_id 供草稿 thumb_media_id 使用
+        return _call(cfg, "/cgi-bin/material/add_material", params={"type": "image"}, files=files)
+    return _call(cfg, "/cgi-bin/media/uploadimg", files=files)
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+_IMAGE_MD = re.compile(r"!\[([^\]]*)\]\(([^)\s]+)\)")
+
+
+def _local_images(markdown: str) -> List[str]:
+    srcs = [src for _, src in _IMAGE_MD.findall(markdown) if not src.startswith(("http://", "https://"))]
+    return list(dict.fromkeys(srcs))
+
+
+def _split_title(markdown: str) -> Tuple[str, str]:
+    lines = markdown.splitlines()
+    for i, ln in enumerate(lines):
+        if ln.startswith("# "):
+            return ln[2:].strip(), "\n".join(lines[:i] + lines[i + 1 :]).strip() + "\n"
+    return "", markdown
+
+
+@lru_cache(maxsize=1)
+def _markdown() -> MarkdownIt:
+    return MarkdownIt("commonmark").enable("table")
+
+
+def _first_paragraph(markdown: str) -> str:
+    tokens = _markdown().parse(markdown)
+    for prev, tok in zip(tokens, tokens[1:]):
+        if prev.type == "paragraph_open" and tok.type == "inline" and not any(c.type == "image" for c in tok.children or []):
+            return tok.content.strip()
+    return ""
+
+
+def render_html(markdown: str, urls: Dict[str, str]) -> str:
+    """把正文中的本地图片路径替换为微信 URL 后渲染为 HTML。"""
+    body = _IMAGE_MD.sub(lambda m: f"![{m.group(1)}]({urls.get(m.group(2), m.group(2))})", markdown)
+    return _markdown().render(body)
+
+
+def run_wechat_draft(article_dir: Path, *, force: bool = False) -> Dict[str, Any]:
+    with telemetry.article_context(article_dir.name), telemetry.timed("wechat_draft") as ev:
+        result = _run_wechat_draft(article_dir, force=force)
+        ev.update({k: v for k, v in result.items() if k != "media_id"})
+        return result
+
+
+def _run_wechat_draft(article_dir: Path, *, force: bool) -> Dict[str, Any]:
+    workflow_path = article_dir / "workflow_state.json"
+    if read_json(workflow_path).get("steps", {}).get("images") != "embedded":
+        raise WechatError("配图尚未全部完成，请先运行 `agent images`")
+    draft_path = article_dir / "article_draft.md"
+    if not draft_path.exists():
+        raise WechatError(f"找不到含图成稿：{draft_path}")
+
+    cfg = _wechat_config()
+    defaults = cfg["draft_default"]
+    title, body = _split_title(draft_path.read_text(encoding="utf-8"))
+    cover = read_json(article_dir / "image_plan.json").get("cover", {})
+    cover_src = cover.get("file", "") if cover.get("status") == "done" else ""
+    if cover_src and not defaults.get("show_cover", True):
+        body = "\n".join(ln for ln in body.splitlines() if f"]({cover_src})" not in ln).strip() + "\n"
+    body_images = _local_images(body)
+    cover_src = cover_src or (body_images[0] if body_images else "")
+    if not cover_src:
+        raise WechatError("草稿需要封面图，但成稿中没有任何图片")
+
+    # 本地路径 → 微信 URL / media_id 的映射：按文件内容哈希判断是否需要重新上传
+    media_path = article_dir / ".cache" / "wechat_media.json"
+    media = read_json(media_path)
+    media.setdefault("body", {})
+    media.setdefault("cover", {})
+    lock = threading.Lock()
+    stats = {"images": len(body_images) + 1, "uploaded": 0, "reused": 0}
+
+    def _ensure(src: str, kind: str) -> None:
+        path = article_dir / src
+        if not path.exists():
+            raise WechatError(f"图片不存在：{path}")
+        digest = _file_sha256(path)
+        known = media[kind].get(src)
+        if known and known.get("sha256") == digest:
+            with lock:
+                stats["reused"] += 1
+            return
+        with telemetry.timed("wechat.upload", kind=kind):
+            data = _upload_image(cfg, path, cover=kind == "cover")
+        with lock:
+            media[kind][src] = {"sha256": digest, "url": data.get("url", ""), "media_id": data.get("media_id", "")}
+            stats["uploaded"] += 1
+            write_text_atomic(media_path, json.dumps(media, ensure_ascii=False, indent=2))
+
+    with ThreadPoolExecutor(max_workers=cfg["upload_concurrency"]) as pool:
+        futures = [telemetry.submit(pool, _ensure, src, "body") for src in body_images]
+        futures.append(telemetry.submit(pool, _ensure, cover_src, "cover"))
+        errors = []
+        for f in futures:
+            try:
+                f.result()
+            except Exception as exc:
+                errors.append(str(exc))
+    if errors:
+        # 已上传成功的图片已记入映射，重跑时只补传失败的部分
+        raise WechatError(f"{len(errors)} 张图片上传失败：{errors[0]}")
+
+    content = render_html(body, {src: media["body"][src]["url"] for src in body_images})
+    write_text_atomic(article_dir / "article_draft.html", content)
+    article = {
+        "title": title[:64],
+        "author": defaults.get("author", ""),
+        "digest": _first_paragraph(body)[:120] if defaults.get("digest_policy") == "auto_first_paragraph" else "",
+        "content": content,
+        "thumb_media_id": media["cover"][cover_src]["media_id"],
+        "need_open_comment": 0,
+        "only_fans_can_comment": 0,
+    }
+
+    # 同一内容只建一次草稿，避免重跑在后台堆出重复草稿
+    record_path = article_dir / "wechat_draft.json"
+    content_hash = hashlib.sha256(json.dumps(article, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    record = read_json(record_path)
+    if record.get("content_sha256") == content_hash and record.get("media_id") and not force:
+        return {**stats, "media_id": record["media_id"], "skipped": True}
+
+    data = _call(cfg, "/cgi-bin/draft/add", body={"articles": [article]})
+    write_text_atomic(
+        record_path,
+        json.dumps(
+            {"media_id": data.get("media_id", ""), "content_sha256": content_hash, "created_at": time.time()},
+            ensure_ascii=False,
+            indent=2,
+        ),
+    )
+    update_workflow_step(workflow_path, "wechat_draft", "done")
+    tick_checklist(article_dir, "8. 转HTML并上传草稿")
+    return {**stats, "media_id": data.get("media_id", ""), "skipped": False}
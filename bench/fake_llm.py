@@ -0,0 +1,234 @@
+"""
+本地 OpenAI 兼容的假 LLM 服务（`POST /chat/completions`，支持 SSE 流式），供基准测试替代真实供应商。
+
+- 延迟：对数正态分布，中位数 `--latency-ms`、形状 `--latency-sigma`（0 为固定延迟），流式时为首包延迟；
+- 错误：按 `--error-rate` 概率返回 `--error-status`（默认 503，客户端会按退避重试）；
+- 响应：按提示词内容返回本项目各阶段能解析的 JSON（要素提取/市场参考/断言抽取/批量核查），
+  其余返回 `--response-chars` 字的正文；内容由提示词哈希决定，同一提示词结果稳定。
+- `GET /stats` 返回请求数、注入的错误数与在途请求峰值。
+
+单独运行（配合 TEXT_LLM_BASE_URL=http://127.0.0.1:8765 手动测试）：
+  python bench/fake_llm.py --port 8765 --latency-ms 800 --error-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+
+_WORDS = ("创作", "效率", "选题", "结构", "复盘", "读者", "流量", "工具", "模板", "节奏", "素材", "观点", "案例", "转化")
+_LISTING = re.compile(r"^(\d+)\.\s", re.M)
+
+
+@dataclass
+class FakeLLMConfig:
+    latency_ms: float = 300.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    error_status: int = 503
+    response_chars: int = 600
+    stream_chunk_chars: int = 20
+    seed: int = 0
+
+
+@dataclass
+class FakeLLMStats:
+    requests: int = 0
+    injected_errors: int = 0
+    inflight: int = 0
+    peak_inflight: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return {"requests": self.requests, "injected_errors": self.injected_errors, "peak_inflight": self.peak_inflight}
+
+
+def _words(seed: str, n: int) -> List[str]:
+    rnd = random.Random(seed)
+    return [rnd.choice(_WORDS) + rnd.choice(_WORDS) for _ in range(n)]
+
+
+def _text(seed: str, chars: int) -> str:
+    sentence = "".join(_words(seed, 6)) + "。"
+    return (sentence * (chars // len(sentence) + 1))[:chars]
+
+
+def _respond(prompt: str, cfg: FakeLLMConfig) -> str:
+    """按提示词里的标志性字段生成对应阶段可解析的响应。"""
+    seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    if "断言：" in prompt:
+        ids = [int(m) for m in _LISTING.findall(prompt.split("断言：", 1)[1])]
+        rnd = random.Random(seed)
+        rows = []
+        for i in ids:
+            confidence = round(rnd.uniform(0.3, 0.95), 2)
+            rows.append(
+                {
+                    "id": i,
+                    "verdict": "supported" if confidence >= 0.6 else "unverifiable",
+                    "confidence": confidence,
+                    "evidence": [{"source": "mp.weixin.qq.com", "snippet": _text(seed + str(i), 40)}],
+                    "suggestion": "" if confidence >= 0.6 else _text(seed + "s" + str(i), 30),
+                }
+            )
+        return json.dumps({"verdicts": rows}, ensure_ascii=False)
+    if "高风险断言" in prompt:
+        # 每章 4 条：1 条跨章共享（验证去重），其余各章不同
+        own = [{"type": "entity", "text": f"{w}是关键因素。", "importance": 2} for w in _words(seed, 3)]
+        shared = {"type": "numeric", "text": "阅读量在三个月内从100增长到5000。", "importance": 3}
+        return json.dumps({"assertions": [shared, *own]}, ensure_ascii=False)
+    if '"title_theme"' in prompt:
+        return json.dumps(
+            {"title_theme": "".join(_words(seed, 3)), "key_points": _words(seed + "k", 6), "primary_keywords": _words(seed + "w", 4)},
+            ensure_ascii=False,
+        )
+    if '"summary"' in prompt and '"keywords"' in prompt:
+        return json.dumps(
+            {"summary": _text(seed, 100), "key_points": _words(seed + "k", 4), "keywords": _words(seed + "w", 4)},
+            ensure_ascii=False,
+        )
+    if "source_domain_whitelist" in prompt:
+        candidates = [
+            {
+                "title": _text(seed + str(i), 16),
+                "url": f"https://mp.weixin.qq.com/s/{seed[i:i + 12]}",
+                "title_hooks": _words(seed + "h" + str(i), 2),
+                "structural_patterns": _words(seed + "p" + str(i), 2),
+                "expression_techniques": _words(seed + "e" + str(i), 2),
+            }
+            for i in range(6)
+        ]
+        return json.dumps(
+            {
+                "platform": "wechat_public",
+                "source_domain_whitelist": ["mp.weixin.qq.com"],
+                "queries": [f"site:mp.weixin.qq.com {w}" for w in _words(seed, 3)],
+                "candidates": candidates,
+                "summary": {"top_title_hooks": _words(seed + "t", 3), "common_structures": _words(seed + "c", 3), "common_devices": _words(seed + "d", 3)},
+            },
+            ensure_ascii=False,
+        )
+    return _text(seed, cfg.response_chars)
+
+
+def _make_handler(cfg: FakeLLMConfig, stats: FakeLLMStats) -> type:
+    rnd = random.Random(cfg.seed)
+    rnd_lock = threading.Lock()
+
+    def _draw() -> Tuple[float, bool]:
+        with rnd_lock:
+            delay = cfg.latency_ms * math.exp(cfg.latency_sigma * rnd.gauss(0.0, 1.0)) if cfg.latency_sigma else cfg.latency_ms
+            return delay / 1000, rnd.random() < cfg.error_rate
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            self._send_json(200, stats.snapshot())
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            delay, fail = _draw()
+            with stats.lock:
+                stats.requests += 1
+                stats.inflight += 1
+                stats.peak_inflight = max(stats.peak_inflight, stats.inflight)
+                stats.injected_errors += int(fail)
+            try:
+                time.sleep(delay)
+                if fail:
+                    self._send_json(cfg.error_status, {"error": {"message": "injected failure"}})
+                    return
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+                content = _respond(prompt, cfg)
+                usage = {"prompt_tokens": len(prompt), "completion_tokens": len(content)}
+                if body.get("stream"):
+                    self._stream(content, usage)
+                else:
+                    self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage})
+            finally:
+                with stats.lock:
+                    stats.inflight -= 1
+
+        def _stream(self, content: str, usage: Dict[str, int]) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            step = max(1, cfg.stream_chunk_chars)
+            for i in range(0, len(content), step):
+                event = {"choices": [{"delta": {"content": content[i : i + step]}}]}
+                if i + step >= len(content):
+                    event["usage"] = usage
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return Handler
+
+
+def start_server(cfg: FakeLLMConfig, port: int = 0) -> Tuple[ThreadingHTTPServer, FakeLLMStats]:
+    """在后台线程启动服务；port=0 时由系统分配端口（见 server.server_address）。"""
+    stats = FakeLLMStats()
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(cfg, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="响应延迟中位数（毫秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="对数正态形状参数，0 为固定延迟")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的概率（0-1）")
+    parser.add_argument("--error-status", type=int, default=503, help="注入错误时的 HTTP 状态码")
+    parser.add_argument("--response-chars", type=int, default=600, help="正文类响应的字数")
+    parser.add_argument("--seed", type=int, default=0, help="延迟与错误抽样的随机种子")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        response_chars=args.response_chars,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的假 LLM 服务")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, _ = start_server(config_from_args(args), args.port)
+    print(f"fake LLM 已启动：TEXT_LLM_BASE_URL=http://127.0.0.1:{server.server_address[1]}（Ctrl+C 退出）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
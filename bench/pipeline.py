@@ -0,0 +1,253 @@
+"""
+端到端流水线基准：本地假 LLM（bench/fake_llm.py）+ 合成文章，测量 outline → draft 的吞吐、阶段延迟与内存峰值。
+
+- 场景：章节数 × 转写稿长度的组合，每个场景在全新的临时项目副本中运行（LLM 缓存关闭、各级缓存均为冷）；
+- 执行：子进程内用 batch.run_batch 并行跑 outline，按场景章节数改写大纲并通过审核，再并行跑 draft；
+- 指标：吞吐（篇/分钟）、各阶段 p50/p99（取自子进程埋点）、子进程峰值 RSS、假服务的请求数与在途峰值；
+- 基线：与 bench/baseline.json 对比，吞吐下降或 p99/内存上升超过容差即视为回退（退出码 1），
+  --save-baseline 用本次结果覆盖基线。只有假服务参数与场景一致时才比较。
+
+运行示例：
+  python bench/pipeline.py
+  python bench/pipeline.py --chapters 3,8,16 --transcript-kb 4,64 --articles 8 --latency-ms 800 --error-rate 0.05
+  python bench/pipeline.py --save-baseline
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fake_llm import add_arguments, config_from_args, start_server
+
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# 报告与基线比较的阶段（名称同 telemetry 埋点）
+STAGES = ("outline", "outline.extract_meta", "outline.market_refs", "draft", "draft.compose", "draft.verify")
+# 基线比较的指标及方向：+1 越大越好，-1 越小越好
+COMPARED = {"outline_apm": 1, "draft_apm": 1, "outline_p99_ms": -1, "draft_p99_ms": -1, "peak_rss_mb": -1}
+
+_PHRASES = (
+    "我们先说结论", "这件事其实很简单", "很多人会忽略一个细节", "具体怎么做呢", "举个例子",
+    "数据上看", "从读者的角度", "复盘的时候发现", "工具只是手段", "最重要的是节奏",
+)
+_FILLERS = ("嗯，", "那个那个，", "就是说就是说，", "")
+
+
+def _make_sandbox(base: Path) -> Path:
+    for name in ("agent.py", "agent_cli", "config", "Templates"):
+        src = ROOT / name
+        if src.is_dir():
+            shutil.copytree(src, base / name, ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            shutil.copy2(src, base / name)
+    for sub in ("Articles/进行中", "Memories/Contents", "Memories/Examples"):
+        (base / sub).mkdir(parents=True, exist_ok=True)
+    return base
+
+
+def _synthetic_transcript(chars: int, seed: int) -> str:
+    """口语化转写稿：带填充词与重复，按句换行，长度约为 chars。"""
+    rnd = random.Random(seed)
+    lines: List[str] = []
+    total = 0
+    while total < chars:
+        line = rnd.choice(_FILLERS) + "，".join(rnd.sample(_PHRASES, 3)) + f"，第{rnd.randint(1, 99)}个要点。"
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def _write_articles(base: Path, count: int, transcript_chars: int) -> None:
+    for i in range(count):
+        materials = base / "Articles" / "进行中" / f"基准文章{i + 1:02d}" / "Materials"
+        materials.mkdir(parents=True)
+        (materials / "transcript.bench.md").write_text(_synthetic_transcript(transcript_chars, i), encoding="utf-8")
+
+
+def _run_scenario(args: argparse.Namespace, base_url: str, chapters: int, transcript_kb: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="agent-pipeline-") as tmp:
+        base = _make_sandbox(Path(tmp))
+        _write_articles(base, args.articles, transcript_kb * 1024)
+        env = {**os.environ, "TEXT_LLM_BASE_URL": base_url, "PERPLEXITY_API_KEY": "bench"}
+        cmd = [sys.executable, str(Path(__file__).resolve()), "--child", str(base), "--chapters", str(chapters), "--workers", str(args.workers)]
+        proc = subprocess.run(cmd, cwd=base, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"场景执行失败：\n{proc.stderr[-2000:]}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _rewrite_outline(article_dir: Path, chapters: int) -> None:
+    # 模拟人工审纲时把章节调整为 N 章（outline 目前固定生成 3 章）
+    path = article_dir / "article_structure.md"
+    head = path.read_text(encoding="utf-8").split("## 章节设计", 1)[0]
+    body = "".join(
+        f"### 第{i + 1}章 {_PHRASES[i % len(_PHRASES)]}\n- 目标：{_PHRASES[(i + 3) % len(_PHRASES)]}\n"
+        f"- 要点：{_PHRASES[(i + 5) % len(_PHRASES)]}、{_PHRASES[(i + 7) % len(_PHRASES)]}\n\n"
+        for i in range(chapters)
+    )
+    path.write_text(head + "## 章节设计\n" + body, encoding="utf-8")
+
+
+def _child(root: Path, chapters: int, workers: int) -> None:
+    """在临时项目副本内执行（由父进程以子进程启动），结果以一行 JSON 输出到 stdout。"""
+    import resource
+
+    sys.path.insert(0, str(root))
+    from agent_cli import llm_cache, market_cache, telemetry
+    from agent_cli.approve import run_approve_outline
+    from agent_cli.batch import run_batch
+    from agent_cli.paths import list_article_dirs
+
+    llm_cache.configure("off")
+    market_cache.configure("off")
+    dirs = list_article_dirs()
+    start = time.monotonic()
+    outline_results = run_batch(dirs, "outline", workers=workers, max_attempts=1)
+    outline_seconds = time.monotonic() - start
+    for d in dirs:
+        _rewrite_outline(d, chapters)
+        run_approve_outline(d)
+    start = time.monotonic()
+    draft_results = run_batch(dirs, "draft", workers=workers, max_attempts=1)
+    draft_seconds = time.monotonic() - start
+
+    summary = telemetry.summarize(telemetry.load_events(1))
+    stages = {r["name"]: {"p50": r["p50"], "p99": r["p99"], "count": r["count"]} for r in summary["stages"]}
+    llm = summary["llm"][0] if summary["llm"] else {}
+    result = {
+        "articles": len(dirs),
+        "failed": sum(1 for r in outline_results + draft_results if r.status != "ok"),
+        "outline_seconds": round(outline_seconds, 2),
+        "draft_seconds": round(draft_seconds, 2),
+        "stages": {name: stages[name] for name in STAGES if name in stages},
+        "llm": {k: llm.get(k, 0) for k in ("count", "p50", "p99", "retries", "errors", "fallbacks")},
+        # Linux 上 ru_maxrss 单位为 KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def _metrics(result: Dict[str, Any]) -> Dict[str, float]:
+    n = result["articles"]
+    stages = result["stages"]
+    return {
+        "outline_apm": round(n / result["outline_seconds"] * 60, 2) if result["outline_seconds"] else 0.0,
+        "draft_apm": round(n / result["draft_seconds"] * 60, 2) if result["draft_seconds"] else 0.0,
+        "outline_p99_ms": stages.get("outline", {}).get("p99", 0.0),
+        "draft_p99_ms": stages.get("draft", {}).get("p99", 0.0),
+        "peak_rss_mb": result["peak_rss_mb"],
+    }
+
+
+def _print_scenario(key: str, result: Dict[str, Any], metrics: Dict[str, float], server: Dict[str, int]) -> None:
+    print(f"\n== {key}：{result['articles']} 篇，失败 {result['failed']} ==")
+    print(
+        f"吞吐  outline {metrics['outline_apm']:.1f} 篇/分钟（{result['outline_seconds']:.1f} s）  "
+        f"draft {metrics['draft_apm']:.1f} 篇/分钟（{result['draft_seconds']:.1f} s）  峰值RSS {metrics['peak_rss_mb']:.0f} MB"
+    )
+    print(f"  {'阶段':<24}{'次数':>6}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for name, row in result["stages"].items():
+        print(f"  {name:<24}{row['count']:>6}{row['p50']:>10.0f}{row['p99']:>10.0f}")
+    llm = result["llm"]
+    print(
+        f"  {'llm_call(网络)':<24}{llm['count']:>6}{llm['p50']:>10.0f}{llm['p99']:>10.0f}"
+        f"   重试 {llm['retries']}，失败 {llm['errors']}，兜底 {llm['fallbacks']}"
+    )
+    print(f"假服务：请求 {server['requests']}，注入错误 {server['injected_errors']}，在途峰值 {server['peak_inflight']}")
+
+
+def _params(args: argparse.Namespace) -> Dict[str, Any]:
+    keys = ("articles", "workers", "latency_ms", "latency_sigma", "error_rate", "response_chars", "seed")
+    return {k: getattr(args, k) for k in keys}
+
+
+def _compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions: List[str] = []
+    for key, metrics in current.items():
+        base = baseline.get("scenarios", {}).get(key)
+        if not base:
+            continue
+        for name, direction in COMPARED.items():
+            old, new = base.get(name), metrics.get(name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if direction * change < -tolerance:
+                regressions.append(f"{key} {name}: {old} → {new}（{change:+.0%}）")
+    return regressions
+
+
+def _parse_ints(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="outline → draft 端到端基准（本地假 LLM）")
+    parser.add_argument("--articles", type=int, default=4, help="每个场景的文章数")
+    parser.add_argument("--chapters", default="3,8", help="章节数列表（逗号分隔）")
+    parser.add_argument("--transcript-kb", default="4,32", help="转写稿大小列表，单位 KB（逗号分隔）")
+    parser.add_argument("--workers", type=int, default=4, help="并行处理的文章数（batch.workers）")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="相对基线允许的退化比例")
+    parser.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, _parse_ints(args.chapters)[0], args.workers)
+        return 0
+
+    scenarios: List[Tuple[int, int]] = [(c, kb) for c in _parse_ints(args.chapters) for kb in _parse_ints(args.transcript_kb)]
+    current: Dict[str, Dict[str, float]] = {}
+    failed = False
+    for chapters, kb in scenarios:
+        key = f"ch{chapters}-tx{kb}k"
+        # 每个场景一个新服务，请求计数与在途峰值互不干扰
+        server, stats = start_server(config_from_args(args))
+        try:
+            result = _run_scenario(args, f"http://127.0.0.1:{server.server_address[1]}", chapters, kb)
+        finally:
+            server.shutdown()
+        current[key] = _metrics(result)
+        failed |= result["failed"] > 0
+        _print_scenario(key, result, current[key], stats.snapshot())
+
+    params = _params(args)
+    if args.save_baseline:
+        payload = {"params": params, "scenarios": current, "python": sys.version.split()[0]}
+        args.baseline.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\n[基线] 已写入 {args.baseline}")
+        return 1 if failed else 0
+
+    baseline: Optional[Dict[str, Any]] = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else None
+    if baseline is None:
+        print("\n[基线] 不存在，跳过比较（--save-baseline 生成）")
+    elif baseline.get("params") != params:
+        print(f"\n[基线] 参数不一致，跳过比较：基线 {baseline.get('params')}")
+    else:
+        regressions = _compare(current, baseline, args.tolerance)
+        for line in regressions:
+            print(f"[回退] {line}")
+        if regressions:
+            failed = True
+        else:
+            print(f"\n[通过] 相对基线的退化均在 {args.tolerance:.0%} 以内")
+    if failed:
+        print("[失败] 存在执行失败的文章或指标回退")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+CLI 冷启动基准：在临时副本中反复以新进程执行 `agent.py approve-outline`，统计耗时并检查导入的模块。
+
+- 耗时：每次都是全新解释器进程（字节码已预热），取中位数并减去 `python -c pass` 空进程的中位数，
+  得到命令自身的启动开销（解释器与 site-packages 的 .pth 属于环境成本，不计入阈值）；
+- 导入：用 `-X importtime` 列出命令实际加载的模块，轻量命令不得加载 typer/requests/dotenv 等重依赖；
+- 超过阈值或出现禁用模块时退出码为 1，可直接接入 CI 或提交前钩子。
+
+运行示例：
+  python bench/startup.py
+  python bench/startup.py --runs 30 --threshold-ms 30
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+ROOT = Path(__file__).resolve().parents[1]
+ARTICLE = "启动基准"
+
+# approve-outline 只读写 JSON/Markdown，以下模块出现即视为回退
+FORBIDDEN = (
+    "typer",
+    "click",
+    "rich",
+    "requests",
+    "urllib3",
+    "dotenv",
+    "jinja2",
+    "agent_cli.cli",
+    "agent_cli.outline",
+    "agent_cli.draft",
+    "agent_cli.llm_perplexity",
+    "agent_cli.telemetry",
+)
+
+
+def _make_sandbox(base: Path) -> Path:
+    # 复制运行所需的最小项目，避免改动真实文章的状态
+    for name in ("agent.py", "agent_cli", "config"):
+        src = ROOT / name
+        if src.is_dir():
+            shutil.copytree(src, base / name, ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            shutil.copy2(src, base / name)
+    article = base / "Articles" / "进行中" / ARTICLE
+    article.mkdir(parents=True)
+    (article / "article_creation.md").write_text(
+        "- [x] 1. 生成大纲\n- [ ] 2. 人工确认A\n- [ ] 3. 生成写作剧本（`article_writing.md`）\n", encoding="utf-8"
+    )
+    return base
+
+
+def _reset(base: Path) -> None:
+    article = base / "Articles" / "进行中" / ARTICLE
+    (article / "article_writing.md").unlink(missing_ok=True)
+    (article / "workflow_state.json").write_text(
+        json.dumps({"current_step": "outline", "steps": {"outline": "pending_review"}}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+
+
+def _time_once(cmd: List[str], cwd: Path) -> float:
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def _import_profile(cmd: List[str], cwd: Path) -> List[Tuple[str, int]]:
+    """返回 [(模块名, 累计导入微秒)]，按耗时降序。"""
+    proc = subprocess.run(
+        [cmd[0], "-X", "importtime", *cmd[1:]], cwd=cwd, check=True, capture_output=True, text=True
+    )
+    modules: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules[name.strip()] = int(cumulative)
+    return sorted(modules.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="agent.py approve-outline 冷启动基准")
+    parser.add_argument("--runs", type=int, default=15, help="计时次数（取中位数）")
+    parser.add_argument("--threshold-ms", type=float, default=40.0, help="命令自身开销（扣除空解释器）的上限")
+    parser.add_argument("--top", type=int, default=10, help="列出导入耗时最高的N个模块")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agent-startup-") as tmp:
+        base = _make_sandbox(Path(tmp))
+        cmd = [sys.executable, "agent.py", "approve-outline", "--article", ARTICLE]
+
+        # 预热一次，生成 __pycache__，之后每次测量都是新进程的“冷启动”
+        _reset(base)
+        _time_once(cmd, base)
+
+        bare = statistics.median(_time_once([sys.executable, "-c", "pass"], base) for _ in range(args.runs))
+        samples: List[float] = []
+        for _ in range(args.runs):
+            _reset(base)
+            samples.append(_time_once(cmd, base))
+        _reset(base)
+        profile = _import_profile(cmd, base)
+
+    median = statistics.median(samples)
+    print(f"approve-outline  中位 {median:.1f} ms  最小 {min(samples):.1f} ms  最大 {max(samples):.1f} ms（{args.runs} 次）")
+    print(f"python -c pass   中位 {bare:.1f} ms，命令自身开销约 {median - bare:.1f} ms")
+    print(f"导入耗时最高的 {args.top} 个模块（累计 µs）：")
+    for name, us in profile[: args.top]:
+        print(f"  {us:>8}  {name}")
+
+    failed = False
+    loaded = {name for name, _ in profile}
+    leaked = [m for m in FORBIDDEN if m in loaded]
+    if leaked:
+        print(f"[回退] approve-outline 加载了重依赖：{', '.join(leaked)}")
+        failed = True
+    if median - bare > args.threshold_ms:
+        print(f"[回退] 命令自身开销 {median - bare:.1f} ms 超过阈值 {args.threshold_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"[通过] 阈值 {args.threshold_ms:.0f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())